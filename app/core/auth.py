@@ -2,9 +2,9 @@
 API 키 기반 인증 모듈
 """
 import os
-from fastapi import Request, HTTPException, status
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+import hmac
+from fastapi import Request, status
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
 
 # 환경 변수 로드
@@ -16,70 +16,63 @@ API_KEY = os.getenv("API_KEY")
 if not API_KEY:
     raise ValueError("API_KEY 환경 변수가 설정되지 않았습니다. .env 파일을 확인하세요.")
 
+# 상수 시간 비교용 바이트 (요청마다 인코딩하지 않도록 미리 계산)
+API_KEY_BYTES = API_KEY.encode("utf-8")
 
-# 인증이 필요 없는 공개 엔드포인트 목록
-PUBLIC_PATHS = [
-    "/",
-    "/health",
-    "/docs",
-    "/redoc",
-    "/openapi.json",
-    "/api/align/",  # GET 헬스체크
-    "/api/grade/",  # GET 헬스체크
-]
+class APIKeyError(Exception):
+    """
+    API 키 인증 실패 예외 (api_key_exception_handler가 401 응답으로 변환)
+    """
 
+    def __init__(self, error: str, detail: str):
+        super().__init__(error)
+        self.error = error
+        self.detail = detail
 
-class APIKeyMiddleware(BaseHTTPMiddleware):
+
+async def verify_api_key(request: Request) -> None:
     """
-    API 키 검증 미들웨어
-    모든 요청에 대해 API 키를 검증하며, 공개 엔드포인트는 제외합니다.
+    API 키 검증 의존성
+    인증이 필요한 라우터에만 등록하여 /health 등 공개 엔드포인트는 검증 과정 자체를 거치지 않음
+
+    Args:
+        request: FastAPI Request 객체
+
+    Raises:
+        APIKeyError: API 키가 없거나 일치하지 않는 경우
     """
+    # GET 요청은 인증 생략 (라우터별 헬스체크 등)
+    if request.method == "GET":
+        return
+
+    # API 키 헤더 확인
+    api_key = request.headers.get("X-API-Key")
+
+    if not api_key:
+        raise APIKeyError("API 키가 제공되지 않았습니다", "X-API-Key 헤더를 포함해주세요")
 
-    async def dispatch(self, request: Request, call_next):
-        """
-        요청 처리 전 API 키 검증
-
-        Args:
-            request: FastAPI Request 객체
-            call_next: 다음 미들웨어 또는 엔드포인트 호출 함수
-
-        Returns:
-            Response: 응답 객체
-        """
-        # 공개 엔드포인트는 인증 생략
-        if request.url.path in PUBLIC_PATHS:
-            return await call_next(request)
-
-        # GET 요청은 인증 생략 (헬스체크 등)
-        if request.method == "GET":
-            return await call_next(request)
-
-        # API 키 헤더 확인
-        api_key = request.headers.get("X-API-Key")
-
-        if not api_key:
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={
-                    "success": False,
-                    "error": "API 키가 제공되지 않았습니다",
-                    "detail": "X-API-Key 헤더를 포함해주세요"
-                },
-                headers={"WWW-Authenticate": "ApiKey"},
-            )
-
-        # API 키 검증
-        if api_key != API_KEY:
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={
-                    "success": False,
-                    "error": "유효하지 않은 API 키입니다",
-                    "detail": "올바른 API 키를 제공해주세요"
-                },
-                headers={"WWW-Authenticate": "ApiKey"},
-            )
-
-        # 검증 통과 시 다음 단계로 진행
-        response = await call_next(request)
-        return response
+    # API 키 검증 (타이밍 공격 방지를 위해 상수 시간 비교)
+    if not hmac.compare_digest(api_key.encode("utf-8"), API_KEY_BYTES):
+        raise APIKeyError("유효하지 않은 API 키입니다", "올바른 API 키를 제공해주세요")
+
+
+async def api_key_exception_handler(request: Request, exc: APIKeyError) -> ORJSONResponse:
+    """
+    API 키 인증 실패 응답 (401)
+
+    Args:
+        request: FastAPI Request 객체
+        exc: 인증 실패 예외
+
+    Returns:
+        ORJSONResponse: 401 응답
+    """
+    return ORJSONResponse(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        content={
+            "success": False,
+            "error": exc.error,
+            "detail": exc.detail
+        },
+        headers={"WWW-Authenticate": "ApiKey"},
+    )
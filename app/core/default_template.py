@@ -0,0 +1,65 @@
+"""
+기본 템플릿(omr_card.jpg) 로딩
+정렬/채점 라우터가 공유하도록 프로세스당 1회만 읽고 캐시를 준비
+"""
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+from fastapi import HTTPException
+
+from app.core.image_utils import prime_template_cache
+
+logger = logging.getLogger(__name__)
+
+# 기본 템플릿 이미지 경로
+DEFAULT_TEMPLATE_PATH = Path(__file__).parent.parent.parent / "omr_card.jpg"
+
+# 기본 템플릿 바이트와 캐시 키 (load_default_template 호출 전에는 None)
+_default_template: Optional[Tuple[bytes, bytes]] = None
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def load_default_template() -> Optional[Tuple[bytes, bytes]]:
+    """
+    기본 템플릿을 읽고 디코딩 결과와 SIFT/ORB 특징점을 미리 캐시 (최초 1회만 수행)
+
+    파일 읽기와 특징점 계산이 블로킹 작업이므로 서버 시작 시 lifespan에서
+    스레드로 호출하여 이벤트 루프와 모듈 import를 막지 않음
+
+    Returns:
+        (템플릿 바이트, 캐시 키) 튜플. 파일이 없으면 None
+    """
+    global _default_template, _loaded
+
+    with _load_lock:
+        if not _loaded:
+            try:
+                template_bytes = DEFAULT_TEMPLATE_PATH.read_bytes()
+                _default_template = (template_bytes, prime_template_cache(template_bytes))
+                logger.info("기본 템플릿 로드 완료: %s", DEFAULT_TEMPLATE_PATH)
+            except FileNotFoundError:
+                logger.warning("기본 템플릿 파일을 찾을 수 없습니다: %s", DEFAULT_TEMPLATE_PATH)
+            _loaded = True
+
+    return _default_template
+
+
+def get_default_template() -> Tuple[bytes, bytes]:
+    """
+    요청 처리용 기본 템플릿 반환 (시작 시 로드되지 않았으면 이 시점에 로드)
+
+    Returns:
+        (템플릿 바이트, 캐시 키) 튜플
+
+    Raises:
+        HTTPException: 500, 기본 템플릿 파일이 없는 경우
+    """
+    default_template = _default_template if _loaded else load_default_template()
+    if default_template is None:
+        raise HTTPException(
+            status_code=500,
+            detail=f"기본 템플릿 파일을 찾을 수 없습니다: {DEFAULT_TEMPLATE_PATH}"
+        )
+    return default_template
@@ -4,7 +4,6 @@
 """
 import cv2
 import numpy as np
-import gc
 from typing import Tuple, Optional
 import logging
 from app.core.memory_optimizer import (
@@ -14,53 +13,53 @@ from app.core.memory_optimizer import (
     get_memory_efficient_sift_params,
     calculate_image_memory
 )
+from app.core.image_utils import (
+    knn_match_descriptors,
+    ratio_test_points,
+    get_template_sift_features,
+    template_cache_key
+)
 
 logger = logging.getLogger(__name__)
 
 
 def align_with_sift_memory_optimized(
-    scan_img: np.ndarray,
-    template_img: np.ndarray,
+    original_scan: np.ndarray,
+    original_template: np.ndarray,
     ratio_threshold: float = 0.7,
     min_good_matches: int = 10,
-    max_memory_mb: float = 10.0
+    max_memory_mb: float = 10.0,
+    template_key: Optional[bytes] = None
 ) -> Tuple[Optional[np.ndarray], int]:
     """
     메모리 최적화된 SIFT 정렬
     다운샘플 → 정렬 → 업샘플 전략 사용
 
     Args:
-        scan_img: 스캔된 이미지
-        template_img: 기준 템플릿 이미지
+        original_scan: 스캔된 이미지 (복사하지 않으며 수정하지 않음)
+        original_template: 기준 템플릿 이미지 (복사하지 않으며 수정하지 않음)
         ratio_threshold: Lowe's ratio test 임계값
         min_good_matches: 최소 유효 매칭 수
         max_memory_mb: 이미지당 최대 메모리 (MB)
+        template_key: 템플릿 특징점 캐시 키 (None이면 매번 계산)
 
     Returns:
         (정렬된 이미지, 매칭 개수) 튜플
     """
-    original_scan = scan_img.copy()
-    original_template = template_img.copy()
-
     try:
         # 1. 메모리 계산
-        scan_memory = calculate_image_memory(scan_img)
-        template_memory = calculate_image_memory(template_img)
-        logger.info(f"원본 메모리: 스캔={scan_memory:.2f}MB, 템플릿={template_memory:.2f}MB")
+        scan_memory = calculate_image_memory(original_scan)
+        template_memory = calculate_image_memory(original_template)
+        logger.info("원본 메모리: 스캔=%.2fMB, 템플릿=%.2fMB", scan_memory, template_memory)
 
         # 2. 이미지 크기에 따른 최적 파라미터
-        params = get_memory_efficient_sift_params(scan_img.shape[:2][::-1])
-        logger.info(f"SIFT 파라미터: {params['description']}")
+        params = get_memory_efficient_sift_params(original_scan.shape[:2][::-1])
+        logger.info("SIFT 파라미터: %s", params['description'])
 
         # 3. 정렬용 다운샘플 (메모리 절약)
         downsample_size = params['downsample_size']
-        scan_small, scan_scale = downsample_for_alignment(scan_img, downsample_size)
-        template_small, template_scale = downsample_for_alignment(template_img, downsample_size)
-
-        # 원본 이미지 임시 삭제 (메모리 절약)
-        del scan_img
-        del template_img
-        gc.collect()
+        scan_small, scan_scale = downsample_for_alignment(original_scan, downsample_size)
+        template_small, template_scale = downsample_for_alignment(original_template, downsample_size)
 
         # 4. 그레이스케일 변환
         gray_scan = cv2.cvtColor(scan_small, cv2.COLOR_BGR2GRAY)
@@ -69,63 +68,45 @@ def align_with_sift_memory_optimized(
         # 5. SIFT 특징점 검출
         sift = cv2.SIFT_create(nfeatures=params['nfeatures'])
         kp1, des1 = sift.detectAndCompute(gray_scan, None)
-        kp2, des2 = sift.detectAndCompute(gray_template, None)
+        kp2, des2 = get_template_sift_features(gray_template, params['nfeatures'], template_key)
 
         # 그레이스케일 이미지 삭제
         del gray_scan
         del gray_template
-        gc.collect()
 
         if des1 is None or des2 is None:
             logger.warning("SIFT 특징점 검출 실패")
             return None, 0
 
-        logger.info(f"SIFT 특징점: 스캔={len(kp1)}, 템플릿={len(kp2)}")
-
-        # 6. FLANN 매칭
-        FLANN_INDEX_KDTREE = 1
-        index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
-        search_params = dict(checks=50)
-        flann = cv2.FlannBasedMatcher(index_params, search_params)
+        logger.info("SIFT 특징점: 스캔=%d, 템플릿=%d", len(kp1), len(kp2))
 
-        matches = flann.knnMatch(des1, des2, k=2)
+        # 6. 디스크립터 매칭 (BFMatcher, 대용량일 때만 FLANN)
+        # FLANN 사용 시 트리 1개로 인덱스 생성 비용/메모리 절감
+        matches = knn_match_descriptors(des1, des2, flann_trees=1, flann_checks=32)
 
         # 디스크립터 삭제
         del des1
         del des2
-        gc.collect()
 
-        # 7. 좋은 매칭 선택
-        good_matches = []
-        for match_pair in matches:
-            if len(match_pair) == 2:
-                m, n = match_pair
-                if m.distance < ratio_threshold * n.distance:
-                    good_matches.append(m)
+        # 7. 좋은 매칭 선택 및 좌표 추출
+        src_pts, dst_pts = ratio_test_points(matches, kp1, kp2, ratio_threshold)
+        good_count = len(src_pts)
 
         del matches
-        gc.collect()
+        del kp1
+        del kp2
 
-        if len(good_matches) < min_good_matches:
-            logger.warning(f"매칭 수 부족: {len(good_matches)} < {min_good_matches}")
-            return None, len(good_matches)
+        if good_count < min_good_matches:
+            logger.warning("매칭 수 부족: %d < %d", good_count, min_good_matches)
+            return None, good_count
 
-        logger.info(f"좋은 매칭 수: {len(good_matches)}")
+        logger.info("좋은 매칭 수: %d", good_count)
 
         # 8. Homography 계산 (다운샘플된 이미지 기준)
-        src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-        dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-
-        del kp1
-        del kp2
-        del good_matches
-        gc.collect()
-
         M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
 
         del src_pts
         del dst_pts
-        gc.collect()
 
         if M is None:
             logger.warning("Homography 계산 실패")
@@ -134,7 +115,6 @@ def align_with_sift_memory_optimized(
         # 9. 다운샘플된 이미지 삭제
         del scan_small
         del template_small
-        gc.collect()
 
         # 10. 원본 크기로 업샘플 (Homography 스케일 조정)
         h, w = original_template.shape[:2]
@@ -147,19 +127,15 @@ def align_with_sift_memory_optimized(
             scan_scale
         )
 
-        del original_scan
-        del original_template
-        gc.collect()
-
         aligned_memory = calculate_image_memory(aligned)
-        logger.info(f"정렬 완료: {aligned_memory:.2f}MB")
+        logger.info("정렬 완료: %.2fMB", aligned_memory)
 
         match_count = int(np.sum(mask)) if mask is not None else 0
 
         return aligned, match_count
 
     except Exception as e:
-        logger.error(f"메모리 최적화 정렬 중 오류: {str(e)}")
+        logger.error("메모리 최적화 정렬 중 오류: %s", e)
         aggressive_cleanup()
         return None, 0
 
@@ -197,7 +173,6 @@ def align_scan_to_template_memory_optimized(
             raise ValueError("스캔 이미지를 불러올 수 없습니다")
 
         del scan_bytes
-        gc.collect()
 
         metadata = {"method": method, "success": False, "max_dimension": max_dimension}
 
@@ -209,12 +184,12 @@ def align_scan_to_template_memory_optimized(
             if template_img is None:
                 raise ValueError("템플릿 이미지를 불러올 수 없습니다")
 
+            template_key = template_cache_key(template_bytes)
             del template_bytes
-            gc.collect()
 
             # 메모리 최적화 정렬
             aligned_img, match_count = align_with_sift_memory_optimized(
-                scan_img, template_img
+                scan_img, template_img, template_key=template_key
             )
 
             metadata["match_count"] = match_count
@@ -222,7 +197,6 @@ def align_scan_to_template_memory_optimized(
             # 템플릿 이미지 삭제
             del template_img
             template_img = None
-            gc.collect()
 
             if aligned_img is not None:
                 metadata["success"] = True
@@ -234,8 +208,8 @@ def align_scan_to_template_memory_optimized(
                 template_img = bytes_to_cv2(template_bytes, max_dimension=max_dimension)
                 h, w = template_img.shape[:2]
                 del template_img
+                template_img = None
                 del template_bytes
-                gc.collect()
             else:
                 w, h = max_dimension, int(max_dimension * 1.414)  # A4 비율
 
@@ -256,13 +230,11 @@ def align_scan_to_template_memory_optimized(
             # 스캔 이미지 삭제
             del scan_img
             scan_img = None
-            gc.collect()
 
         # 3. 이미지 품질 개선 (선택적)
         if enhance and metadata["success"]:
             aligned_img = enhance_image(aligned_img, denoise=False)
             metadata["enhanced"] = True
-            gc.collect()
 
         # 4. 메타데이터 추가
         metadata["width"] = aligned_img.shape[1]
@@ -272,20 +244,11 @@ def align_scan_to_template_memory_optimized(
         # 5. 바이트로 변환 (압축 품질 낮춰서 메모리 절약)
         result_bytes = cv2_to_bytes(aligned_img, format='.jpg', quality=85)
 
-        del aligned_img
-        gc.collect()
-
         return result_bytes, metadata
 
     except Exception as e:
-        logger.error(f"메모리 최적화 정렬 오류: {str(e)}")
-        raise
-    finally:
-        # 최종 메모리 정리
-        if scan_img is not None:
-            del scan_img
-        if template_img is not None:
-            del template_img
-        if aligned_img is not None:
-            del aligned_img
+        logger.error("메모리 최적화 정렬 오류: %s", e)
+        # 예외 경로에서만 순환 참조 정리 (정상 경로는 참조 카운트로 즉시 해제)
+        scan_img = template_img = aligned_img = None
         aggressive_cleanup()
+        raise
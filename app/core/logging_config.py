@@ -9,6 +9,10 @@ from fastapi import Request
 
 logger = logging.getLogger(__name__)
 
+# 헬스체크 로그 판별용 상수
+HEALTH_CHECK_PATH = "/health"
+HEALTH_CHECK_TOKEN = "GET /health"
+
 
 class HealthCheckFilter(logging.Filter):
     """
@@ -24,8 +28,16 @@ class HealthCheckFilter(logging.Filter):
         Returns:
             bool: True면 로그 출력, False면 로그 제외
         """
-        # /health 엔드포인트 로그 제외
-        return "GET /health" not in record.getMessage()
+        args = record.args
+
+        # uvicorn.access 로그는 args = (client_addr, method, full_path, http_version, status_code)
+        # 메시지 전체를 포맷하지 않고 method/path 인자만 확인
+        if isinstance(args, tuple) and len(args) >= 3:
+            method, path = args[1], args[2]
+            return not (method == "GET" and isinstance(path, str) and path.startswith(HEALTH_CHECK_PATH))
+
+        # 그 외 형식의 로그는 기존처럼 메시지 문자열로 판단
+        return HEALTH_CHECK_TOKEN not in record.getMessage()
 
 
 def log_api_call(endpoint_name: str):
@@ -40,51 +52,36 @@ def log_api_call(endpoint_name: str):
         async def wrapper(*args, **kwargs):
             start_time = time.time()
 
-            # 요청 정보 추출
-            request_info = {}
-            for arg in args:
-                if isinstance(arg, Request):
-                    request_info = {
-                        "client": arg.client.host if arg.client else "unknown",
-                        "method": arg.method,
-                        "url": str(arg.url)
-                    }
-                    break
-
-            # 파라미터 정보 (파일 제외)
-            params = {}
-            for key, value in kwargs.items():
-                if not hasattr(value, 'file'):  # UploadFile 제외
-                    if key == 'answer_key' and isinstance(value, str) and len(value) > 50:
-                        params[key] = value[:50] + "..."  # 긴 정답 키는 축약
-                    else:
-                        params[key] = value
-
-            logger.info(
-                f"[{endpoint_name}] 요청 시작 | "
-                f"Client: {request_info.get('client', 'unknown')} | "
-                f"Params: {params}"
-            )
+            # 요청 정보/파라미터 추출은 INFO 로그가 실제 출력될 때만 수행
+            if logger.isEnabledFor(logging.INFO):
+                client = "unknown"
+                for arg in args:
+                    if isinstance(arg, Request):
+                        client = arg.client.host if arg.client else "unknown"
+                        break
+
+                # 파라미터 정보 (파일 제외)
+                params = {}
+                for key, value in kwargs.items():
+                    if not hasattr(value, 'file'):  # UploadFile 제외
+                        if key == 'answer_key' and isinstance(value, str) and len(value) > 50:
+                            params[key] = value[:50] + "..."  # 긴 정답 키는 축약
+                        else:
+                            params[key] = value
+
+                logger.info("[%s] 요청 시작 | Client: %s | Params: %s", endpoint_name, client, params)
 
             try:
                 result = await func(*args, **kwargs)
 
                 elapsed_time = time.time() - start_time
-                logger.info(
-                    f"[{endpoint_name}] 요청 완료 | "
-                    f"소요 시간: {elapsed_time:.2f}초 | "
-                    f"성공: True"
-                )
+                logger.info("[%s] 요청 완료 | 소요 시간: %.2f초 | 성공: True", endpoint_name, elapsed_time)
 
                 return result
 
             except Exception as e:
                 elapsed_time = time.time() - start_time
-                logger.error(
-                    f"[{endpoint_name}] 요청 실패 | "
-                    f"소요 시간: {elapsed_time:.2f}초 | "
-                    f"에러: {str(e)}"
-                )
+                logger.error("[%s] 요청 실패 | 소요 시간: %.2f초 | 에러: %s", endpoint_name, elapsed_time, e)
                 raise
 
         return wrapper
@@ -1,6 +1,8 @@
 """
 메모리 사용량 모니터링 유틸리티
 """
+import os
+import time
 import logging
 from typing import Dict
 
@@ -14,6 +16,13 @@ except ImportError:
     PSUTIL_AVAILABLE = False
     logger.warning("psutil을 사용할 수 없습니다. 메모리 모니터링이 비활성화됩니다.")
 
+# 현재 프로세스 핸들 (호출마다 새로 생성하지 않도록 재사용)
+_PROC = psutil.Process() if PSUTIL_AVAILABLE else None
+
+# 메모리 샘플 캐시 유지 시간 (초). 이 시간 내 재호출은 /proc 조회 없이 캐시값 반환
+MEMORY_SAMPLE_TTL = float(os.getenv("MEMORY_SAMPLE_TTL", "0.2"))
+_memory_sample = {"time": 0.0, "value": None}
+
 
 def get_memory_usage() -> Dict[str, float]:
     """
@@ -30,15 +39,25 @@ def get_memory_usage() -> Dict[str, float]:
     if not PSUTIL_AVAILABLE:
         return {"rss_mb": 0.0, "vms_mb": 0.0, "percent": 0.0}
 
-    process = psutil.Process()
-    memory_info = process.memory_info()
+    # TTL 내 재호출은 캐시된 샘플 반환
+    now = time.monotonic()
+    cached = _memory_sample["value"]
+    if cached is not None and now - _memory_sample["time"] < MEMORY_SAMPLE_TTL:
+        return dict(cached)
 
-    return {
-        "rss_mb": round(memory_info.rss / 1024 / 1024, 2),  # Resident Set Size (실제 물리 메모리)
-        "vms_mb": round(memory_info.vms / 1024 / 1024, 2),  # Virtual Memory Size
-        "percent": round(process.memory_percent(), 2)
+    memory_info = _PROC.memory_info()
+
+    # 반올림은 출력 시점에 포맷 문자열로 처리
+    memory = {
+        "rss_mb": memory_info.rss / 1048576,  # Resident Set Size (실제 물리 메모리)
+        "vms_mb": memory_info.vms / 1048576,  # Virtual Memory Size
+        "percent": _PROC.memory_percent()
     }
 
+    _memory_sample["time"] = now
+    _memory_sample["value"] = memory
+    return dict(memory)
+
 
 def log_memory_usage(prefix: str = ""):
     """
@@ -48,12 +67,14 @@ def log_memory_usage(prefix: str = ""):
         prefix: 로그 메시지 접두사
     """
     if not PSUTIL_AVAILABLE:
-        logger.debug(f"{prefix}메모리 모니터링 비활성화 (psutil 없음)")
+        logger.debug("%s메모리 모니터링 비활성화 (psutil 없음)", prefix)
         return {"rss_mb": 0.0, "vms_mb": 0.0, "percent": 0.0}
 
     memory = get_memory_usage()
-    message = f"{prefix}메모리 사용량 - RSS: {memory['rss_mb']}MB, VMS: {memory['vms_mb']}MB, 사용률: {memory['percent']}%"
-    logger.info(message)
+    logger.info(
+        "%s메모리 사용량 - RSS: %.2fMB, VMS: %.2fMB, 사용률: %.2f%%",
+        prefix, memory['rss_mb'], memory['vms_mb'], memory['percent']
+    )
     return memory
 
 
@@ -86,12 +107,8 @@ def log_system_memory():
         return {"total_mb": 0.0, "available_mb": 0.0, "used_mb": 0.0, "percent": 0.0}
 
     memory = get_system_memory()
-    message = (
-        f"시스템 메모리 - "
-        f"전체: {memory['total_mb']}MB, "
-        f"사용: {memory['used_mb']}MB, "
-        f"가용: {memory['available_mb']}MB, "
-        f"사용률: {memory['percent']}%"
+    logger.info(
+        "시스템 메모리 - 전체: %sMB, 사용: %sMB, 가용: %sMB, 사용률: %s%%",
+        memory['total_mb'], memory['used_mb'], memory['available_mb'], memory['percent']
     )
-    logger.info(message)
     return memory
@@ -4,12 +4,39 @@
 """
 import cv2
 import numpy as np
+import ctypes
 import gc
+import math
+import os
 from typing import Tuple, Optional, List
 import logging
+import time
+from app.core.memory_monitor import PSUTIL_AVAILABLE, get_memory_usage
 
 logger = logging.getLogger(__name__)
 
+# 메모리 압박 판단 기준 (프로세스 RSS, MB). 512MB 컨테이너 제한의 약 70%
+# 사용률(%)은 호스트 전체 RAM 대비 값이라 컨테이너 제한에 가까워져도 낮게 나오므로 RSS로 판단
+GC_RSS_MB_THRESHOLD = float(os.getenv("GC_RSS_MB_THRESHOLD", "360"))
+# gc.collect() 최소 호출 간격 (초)
+GC_MIN_INTERVAL = 1.0
+_last_gc_ts = 0.0
+
+# /proc/self/statm 페이지 수를 MB로 환산하는 계수 (psutil이 없는 서버에서 RSS 측정용)
+try:
+    _PAGE_SIZE_MB = os.sysconf("SC_PAGE_SIZE") / 1048576
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE_MB = None
+
+# glibc malloc_trim (Linux/glibc 외 환경에서는 None)
+try:
+    _MALLOC_TRIM = ctypes.CDLL("libc.so.6").malloc_trim
+except (OSError, AttributeError):
+    _MALLOC_TRIM = None
+
+# 이 비율보다 작게 축소할 때는 INTER_AREA 대신 INTER_LINEAR 사용 (정렬용)
+FAST_DOWNSAMPLE_SCALE = 0.25
+
 
 def calculate_image_memory(img: np.ndarray) -> float:
     """
@@ -20,13 +47,18 @@ def calculate_image_memory(img: np.ndarray) -> float:
     return img.nbytes / (1024 * 1024)
 
 
-def optimize_image_size(img: np.ndarray, max_memory_mb: float = 5.0) -> np.ndarray:
+def optimize_image_size(
+    img: np.ndarray,
+    max_memory_mb: float = 5.0,
+    interp: int = cv2.INTER_AREA
+) -> np.ndarray:
     """
     이미지 크기를 메모리 제한에 맞춰 최적화
 
     Args:
         img: 입력 이미지
         max_memory_mb: 최대 메모리 크기 (MB)
+        interp: 2의 거듭제곱 축소 후 남은 비율에 사용할 보간 방식 (기본 INTER_AREA)
 
     Returns:
         최적화된 이미지
@@ -37,19 +69,23 @@ def optimize_image_size(img: np.ndarray, max_memory_mb: float = 5.0) -> np.ndarr
         return img
 
     # 축소 비율 계산
-    scale = np.sqrt(max_memory_mb / current_memory)
+    scale = math.sqrt(max_memory_mb / current_memory)
     h, w = img.shape[:2]
     new_w = int(w * scale)
     new_h = int(h * scale)
 
-    logger.info(f"메모리 최적화: {current_memory:.2f}MB → {max_memory_mb:.2f}MB, "
-                f"크기: {w}x{h} → {new_w}x{new_h}")
+    logger.info("메모리 최적화: %.2fMB → %.2fMB, 크기: %dx%d → %dx%d",
+                current_memory, max_memory_mb, w, h, new_w, new_h)
 
-    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    # 2배 축소 단위는 pyrDown(SIMD 최적화된 5-tap 필터)으로 처리
+    levels = max(0, int(math.floor(-math.log2(scale))))
+    resized = img
+    for _ in range(levels):
+        resized = cv2.pyrDown(resized)
 
-    # 원본 메모리 해제
-    del img
-    gc.collect()
+    # 남은 비율(0.5~1배)이 메모리 제한을 넘길 때만 최종 리사이즈
+    if calculate_image_memory(resized) > max_memory_mb:
+        resized = cv2.resize(resized, (new_w, new_h), interpolation=interp)
 
     return resized
 
@@ -57,10 +93,71 @@ def optimize_image_size(img: np.ndarray, max_memory_mb: float = 5.0) -> np.ndarr
 def aggressive_cleanup():
     """
     공격적인 메모리 정리
+
+    numpy 버퍼는 참조 카운트로 즉시 해제되므로 순환 참조 정리용 1회면 충분
     """
+    global _last_gc_ts
     gc.collect()
-    gc.collect()  # 2번 호출하면 더 효과적
+    _last_gc_ts = time.monotonic()
+
+
+def release_free_memory() -> bool:
+    """
+    malloc 아레나의 빈 페이지를 OS에 반환 (GC 객체 그래프는 순회하지 않음)
+
+    큰 numpy/bytes 버퍼는 참조 카운트로 이미 해제되지만, 해제된 메모리가
+    프로세스 RSS에 남아 있는 경우 배치 종료 시 1회 호출
+
+    Returns:
+        메모리를 반환했으면 True (glibc가 아닌 환경에서는 항상 False)
+    """
+    if _MALLOC_TRIM is None:
+        return False
+    return bool(_MALLOC_TRIM(0))
+
+
+def _process_rss_mb() -> Optional[float]:
+    """
+    현재 프로세스 RSS (MB) 반환
+
+    psutil이 없으면 (프로덕션 기본 설정) /proc/self/statm에서 직접 읽음
+
+    Returns:
+        RSS (MB), 측정할 수 없으면 None
+    """
+    if PSUTIL_AVAILABLE:
+        return get_memory_usage()["rss_mb"]
+    if _PAGE_SIZE_MB is None:
+        return None
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE_MB
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def collect_if_memory_high(threshold_mb: float = GC_RSS_MB_THRESHOLD) -> bool:
+    """
+    프로세스 RSS가 임계값을 넘을 때만 gc.collect() 실행 (최대 초당 1회)
+
+    Args:
+        threshold_mb: GC를 실행할 RSS (MB)
+
+    Returns:
+        GC 실행 여부
+    """
+    global _last_gc_ts
+    now = time.monotonic()
+    if now - _last_gc_ts < GC_MIN_INTERVAL:
+        return False
+    # RSS를 측정할 수 없으면 임계값 미만으로 간주하지 않고 GC 실행 (간격 제한은 유지)
+    rss_mb = _process_rss_mb()
+    if rss_mb is not None and rss_mb <= threshold_mb:
+        return False
+
     gc.collect()
+    _last_gc_ts = now
+    return True
 
 
 def process_with_memory_limit(
@@ -84,13 +181,19 @@ def process_with_memory_limit(
             aggressive_cleanup()
 
 
-def downsample_for_alignment(img: np.ndarray, target_size: int = 800) -> Tuple[np.ndarray, float]:
+def downsample_for_alignment(
+    img: np.ndarray,
+    target_size: int = 800,
+    interp: Optional[int] = None
+) -> Tuple[np.ndarray, float]:
     """
     정렬용으로 이미지를 다운샘플링 (메모리 절약)
 
     Args:
         img: 원본 이미지
         target_size: 목표 최대 크기 (px)
+        interp: 보간 방식 (None이면 4배 초과 축소 시 INTER_LINEAR, 그 외 INTER_AREA).
+            SIFT는 보간 방식에 둔감하므로 큰 축소에서는 INTER_LINEAR로 충분
 
     Returns:
         (다운샘플된 이미지, 스케일 비율)
@@ -105,7 +208,10 @@ def downsample_for_alignment(img: np.ndarray, target_size: int = 800) -> Tuple[n
     new_w = int(w * scale)
     new_h = int(h * scale)
 
-    downsampled = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    if interp is None:
+        interp = cv2.INTER_LINEAR if scale < FAST_DOWNSAMPLE_SCALE else cv2.INTER_AREA
+
+    downsampled = cv2.resize(img, (new_w, new_h), interpolation=interp)
 
     logger.info(f"정렬용 다운샘플: {w}x{h} → {new_w}x{new_h} (스케일: {scale:.3f})")
 
@@ -130,15 +236,12 @@ def upsample_with_homography(
     Returns:
         정렬된 고해상도 이미지
     """
-    # Homography 스케일 조정
-    scale_matrix = np.array([
-        [1/scale, 0, 0],
-        [0, 1/scale, 0],
-        [0, 0, 1]
-    ], dtype=np.float32)
-
-    # H_full = S^-1 * H * S
-    adjusted_H = scale_matrix @ homography @ np.linalg.inv(scale_matrix)
+    # H_full = S * H * S^-1 (S = diag(1/scale, 1/scale, 1))
+    # S가 대각행렬이므로 역행렬/행렬곱 없이 원소별 스케일로 계산:
+    # 좌상단 2x2와 H[2,2]는 상쇄되어 그대로, 이동 성분은 1/scale배, 원근 성분은 scale배
+    adjusted_H = np.array(homography, dtype=np.float64)
+    adjusted_H[:2, 2] /= scale
+    adjusted_H[2, :2] *= scale
 
     # 고해상도 이미지에 적용
     aligned = cv2.warpPerspective(img, adjusted_H, target_shape)
@@ -183,9 +286,9 @@ def process_roi_in_batches(
 
         results.extend(batch_results)
 
-        # 배치마다 메모리 정리
+        # 메모리 압박이 있을 때만 정리
         if batch_end < total_items:
-            gc.collect()
+            collect_if_memory_high()
 
     return results
 
@@ -227,27 +330,3 @@ def get_memory_efficient_sift_params(image_size: Tuple[int, int]) -> dict:
             'downsample_size': 1000,
             'description': '1200px 초과 - 300 특징점, 1000px로 다운샘플'
         }
-
-
-def compress_image_quality(img: np.ndarray, quality: int = 75) -> np.ndarray:
-    """
-    JPEG 압축을 통한 메모리 절약 (손실 압축)
-
-    Args:
-        img: 입력 이미지
-        quality: JPEG 품질 (1-100)
-
-    Returns:
-        압축 후 이미지
-    """
-    encode_param = [cv2.IMWRITE_JPEG_QUALITY, quality]
-    _, encoded = cv2.imencode('.jpg', img, encode_param)
-    compressed = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
-
-    original_memory = calculate_image_memory(img)
-    compressed_memory = calculate_image_memory(compressed)
-
-    logger.info(f"이미지 압축: {original_memory:.2f}MB → {compressed_memory:.2f}MB "
-                f"(품질: {quality})")
-
-    return compressed
@@ -0,0 +1,34 @@
+"""
+Numba JIT 유틸리티
+numba가 설치되지 않은 환경에서는 데코레이터가 원본 함수를 그대로 반환하여
+동일한 NumPy 코드 경로로 동작
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# numba를 선택적으로 import (서버 환경에서 없을 수 있음)
+try:
+    from numba import njit as _numba_njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    logger.info("numba를 사용할 수 없습니다. NumPy 경로로 실행합니다.")
+
+
+def njit(*args, **kwargs):
+    """
+    numba.njit 래퍼 (numba 미설치 시 no-op)
+
+    @njit 와 @njit(cache=True) 두 형태를 모두 지원
+    """
+    if NUMBA_AVAILABLE:
+        return _numba_njit(*args, **kwargs)
+
+    # @njit 형태 (인자 없이 함수가 바로 전달된 경우)
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+
+    def decorator(func):
+        return func
+    return decorator
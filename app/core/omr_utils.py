@@ -4,7 +4,9 @@ OMR(Optical Mark Recognition) 채점 관련 유틸리티 함수
 import cv2
 import numpy as np
 from typing import List, Dict, Tuple, Optional, Any
+from functools import lru_cache
 import logging
+from app.core.numba_utils import njit, NUMBA_AVAILABLE
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,13 @@ GRID_CONFIG = {
 }
 # ============================================
 
+# 문제 번호 → (열 설정, 열 내 인덱스) 조회 테이블 (인덱스 0은 사용하지 않음)
+_QUESTION_COLUMNS = [None] * (GRID_CONFIG["columns"][-1]["end"] + 1)
+for _col in GRID_CONFIG["columns"]:
+    for _q in range(_col["start"], _col["end"] + 1):
+        _QUESTION_COLUMNS[_q] = (_col, _q - _col["start"])
+del _col, _q
+
 
 def get_bubble_roi(
     img_height: int,
@@ -49,21 +58,16 @@ def get_bubble_roi(
     Returns:
         (x, y, width, height) 픽셀 좌표
     """
-    # 해당 문제가 속한 열 찾기
-    column = None
-    for col in GRID_CONFIG["columns"]:
-        if col["start"] <= question <= col["end"]:
-            column = col
-            break
+    # 해당 문제가 속한 열과 열 내 인덱스 조회
+    entry = _QUESTION_COLUMNS[question] if 1 <= question < len(_QUESTION_COLUMNS) else None
 
-    if column is None:
+    if entry is None:
         raise ValueError(f"문제 번호 {question}은(는) 유효하지 않습니다 (1-45)")
 
     if not (1 <= option <= GRID_CONFIG["options_per_question"]):
         raise ValueError(f"선택지 번호 {option}은(는) 유효하지 않습니다 (1-5)")
 
-    # 열 내에서의 인덱스
-    index_in_column = question - column["start"]
+    column, index_in_column = entry
 
     # 퍼센트를 픽셀로 변환
     x_percent = column["start_x"] + (option - 1) * GRID_CONFIG["horizontal_spacing"]
@@ -77,6 +81,52 @@ def get_bubble_roi(
     return (x, y, width, height)
 
 
+@lru_cache(maxsize=16)
+def get_bubble_rois(img_height: int, img_width: int) -> Tuple[np.ndarray, np.ndarray, int, int]:
+    """
+    전체 45문항 x 5선택지 버블 ROI 좌표를 한 번에 계산 (이미지 크기별 캐시)
+    get_bubble_roi와 동일한 산술/정수 변환을 NumPy로 벡터화
+
+    Args:
+        img_height: 이미지 높이
+        img_width: 이미지 너비
+
+    Returns:
+        (xs, ys, width, height) 튜플
+        xs, ys: (45, 5) int32 배열 (읽기 전용), [문제-1, 선택지-1] 인덱스
+        width, height: 버블 크기 (모든 버블 동일)
+    """
+    total_questions = GRID_CONFIG["columns"][-1]["end"]
+    options = GRID_CONFIG["options_per_question"]
+
+    # 문제별 열 시작 좌표 / 열 내 인덱스
+    start_x = np.empty(total_questions, dtype=np.float64)
+    start_y = np.empty(total_questions, dtype=np.float64)
+    index_in_column = np.empty(total_questions, dtype=np.float64)
+    for col in GRID_CONFIG["columns"]:
+        rows = slice(col["start"] - 1, col["end"])
+        start_x[rows] = col["start_x"]
+        start_y[rows] = col["start_y"]
+        index_in_column[rows] = np.arange(col["end"] - col["start"] + 1)
+
+    option_offset = np.arange(options) * GRID_CONFIG["horizontal_spacing"]
+
+    # 퍼센트를 픽셀로 변환 (get_bubble_roi와 동일한 연산 순서)
+    x_percent = start_x[:, None] + option_offset[None, :]
+    y_percent = start_y + index_in_column * GRID_CONFIG["vertical_spacing"]
+
+    xs = (x_percent * img_width / 100).astype(np.int32)
+    ys = np.repeat((y_percent * img_height / 100).astype(np.int32)[:, None], options, axis=1)
+    width = int(GRID_CONFIG["marker_width"] * img_width / 100)
+    height = int(GRID_CONFIG["marker_height"] * img_height / 100)
+
+    # 캐시된 배열이 호출자에 의해 변경되지 않도록 보호
+    xs.setflags(write=False)
+    ys.setflags(write=False)
+
+    return xs, ys, width, height
+
+
 def is_bubble_marked(
     img: np.ndarray,
     x: int,
@@ -100,7 +150,7 @@ def is_bubble_marked(
     roi = img[y:y+height, x:x+width]
 
     if roi.size == 0:
-        logger.warning(f"ROI가 비어있습니다: ({x}, {y}, {width}, {height})")
+        logger.warning("ROI가 비어있습니다: (%d, %d, %d, %d)", x, y, width, height)
         return False, 0.0
 
     # 이진화 (Otsu)
@@ -115,6 +165,100 @@ def is_bubble_marked(
     return is_marked, dark_pixel_ratio
 
 
+def binarize_sheet(gray: np.ndarray) -> np.ndarray:
+    """
+    답안지 전체를 전역 Otsu 임계값으로 한 번에 이진화
+    ROI마다 히스토그램을 다시 계산하지 않도록 한 번만 수행
+
+    Args:
+        gray: 그레이스케일 이미지
+
+    Returns:
+        어두운 픽셀은 1, 밝은 픽셀은 0인 uint8 이진 이미지
+    """
+    _, binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return binary
+
+
+@lru_cache(maxsize=16)
+def get_bubble_rects(img_height: int, img_width: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    전체 버블 ROI를 이미지 경계로 자른 사각형 좌표 (이미지 크기별 캐시)
+    정렬된 답안지는 항상 템플릿 크기로 워프되므로 요청 간 재사용됨
+
+    Args:
+        img_height: 이미지 높이
+        img_width: 이미지 너비
+
+    Returns:
+        (x0, y0, x1, y1) 튜플, 각각 (45, 5) int32 배열 (읽기 전용)
+        슬라이스 img[y0:y1, x0:x1]과 같은 영역
+    """
+    xs, ys, width, height = get_bubble_rois(img_height, img_width)
+
+    x0 = np.clip(xs, 0, img_width)
+    y0 = np.clip(ys, 0, img_height)
+    x1 = np.clip(xs + max(width, 0), 0, img_width)
+    y1 = np.clip(ys + max(height, 0), 0, img_height)
+
+    for arr in (x0, y0, x1, y1):
+        arr.setflags(write=False)
+
+    return x0, y0, x1, y1
+
+
+def compute_bubble_densities(
+    binary: np.ndarray,
+    rects: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+) -> np.ndarray:
+    """
+    모든 버블 ROI의 어두움 비율을 한 번에 계산
+
+    Args:
+        binary: binarize_sheet()로 만든 0/1 이진 이미지
+        rects: get_bubble_rects()의 (x0, y0, x1, y1) 좌표 배열
+
+    Returns:
+        (문항, 선택지) 형태의 어두움 비율 배열 (float64), 빈 ROI는 0
+    """
+    x0, y0, x1, y1 = rects
+
+    # numba가 있으면 ROI 픽셀만 직접 합산 (ROI 면적 합이 시트 전체보다 훨씬 작음)
+    if NUMBA_AVAILABLE:
+        return _roi_density_kernel(binary, x0, y0, x1, y1)
+
+    # 적분 영상 1회 계산 후 ROI당 4번 조회로 합산 ((H+1, W+1) int32)
+    integral = cv2.integral(binary)
+    sums = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+
+    area = (x1 - x0) * (y1 - y0)
+    densities = np.zeros(area.shape, dtype=np.float64)
+    np.divide(sums, area, out=densities, where=area > 0)
+    return densities
+
+
+@njit(cache=True, fastmath=True)
+def _roi_density_kernel(binary, x0, y0, x1, y1):
+    """
+    compute_bubble_densities의 numba 커널
+    """
+    n_rows, n_cols = x0.shape
+    out = np.zeros((n_rows, n_cols), dtype=np.float64)
+
+    for q in range(n_rows):
+        for o in range(n_cols):
+            area = (x1[q, o] - x0[q, o]) * (y1[q, o] - y0[q, o])
+            if area <= 0:
+                continue
+            count = 0
+            for r in range(y0[q, o], y1[q, o]):
+                for c in range(x0[q, o], x1[q, o]):
+                    count += binary[r, c]
+            out[q, o] = count / area
+
+    return out
+
+
 def detect_bubbles(
     img: np.ndarray,
     threshold: float = 0.45
@@ -134,49 +278,61 @@ def detect_bubbles(
     if len(img.shape) == 3:
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     else:
-        gray = img.copy()
+        # 읽기 전용으로만 사용하므로 복사하지 않음
+        gray = img
 
     img_height, img_width = gray.shape
-    answers = {}
-    multiple_marked_questions = []  # 중복 마킹된 문제 번호 저장
+    rects = get_bubble_rects(img_height, img_width)
 
-    # 45개 문제 순회
-    for question in range(1, 46):
-        marked_options = []
-
-        # 5개 선택지 순회
-        for option in range(1, 6):
-            try:
-                x, y, width, height = get_bubble_roi(img_height, img_width, question, option)
-                is_marked, density = is_bubble_marked(gray, x, y, width, height, threshold)
-
-                if is_marked:
-                    marked_options.append((option, density))
-
-            except Exception as e:
-                logger.error(f"문제 {question}, 선택지 {option} 처리 중 오류: {str(e)}")
-
-        # 마킹된 선택지 처리
-        if len(marked_options) == 0:
-            # 무응답
-            answers[question] = None
-        elif len(marked_options) == 1:
-            # 정상 마킹
-            answers[question] = marked_options[0][0]
-            logger.debug(f"문제 {question}: {marked_options[0][0]}번 마킹 (어두움: {marked_options[0][1]:.3f})")
-        else:
-            # 중복 마킹 - 가장 어두운 것 선택
-            marked_options.sort(key=lambda x: x[1], reverse=True)
-            answers[question] = marked_options[0][0]
-            multiple_marked_questions.append(question)
+    # 전역 Otsu 이진화 (1회)
+    binary = binarize_sheet(gray)
+
+    # 225개 버블 어두움 비율을 한 번에 계산 (45, 5)
+    densities = compute_bubble_densities(binary, rects)
+
+    answers, multiple_marked_questions = _pick_answers(densities, threshold)
 
     # 중복 마킹 요약 출력
     if multiple_marked_questions:
-        logger.warning(f"⚠️ 중복 마킹 문제 감지: 총 {len(multiple_marked_questions)}개 (문제 번호: {multiple_marked_questions})")
+        logger.warning("⚠️ 중복 마킹 문제 감지: 총 %d개 (문제 번호: %s)", len(multiple_marked_questions), multiple_marked_questions)
 
     return answers
 
 
+def _pick_answers(
+    densities: np.ndarray,
+    threshold: float
+) -> Tuple[Dict[int, Optional[int]], List[int]]:
+    """
+    (문항, 선택지) 어두움 비율 배열에서 문항별 답안 선택
+
+    마킹이 없으면 None, 여러 개면 가장 어두운 선택지 (동률이면 앞 번호)
+
+    Args:
+        densities: compute_bubble_densities() 결과
+        threshold: 마킹 판단 임계값
+
+    Returns:
+        (답안 딕셔너리, 중복 마킹된 문제 번호 목록)
+    """
+    marked_counts = (densities > threshold).sum(axis=1)
+    # 마킹된 선택지 중 가장 어두운 것 = 행 전체의 최댓값
+    picks = densities.argmax(axis=1) + 1
+
+    answers = {
+        q_idx + 1: (int(picks[q_idx]) if count else None)
+        for q_idx, count in enumerate(marked_counts.tolist())
+    }
+    multiple_marked_questions = (np.flatnonzero(marked_counts > 1) + 1).tolist()
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for q_idx in np.flatnonzero(marked_counts == 1).tolist():
+            option = int(picks[q_idx])
+            logger.debug("문제 %d: %d번 마킹 (어두움: %.3f)", q_idx + 1, option, densities[q_idx, option - 1])
+
+    return answers, multiple_marked_questions
+
+
 def grade_omr_sheet(
     img: np.ndarray,
     answer_key: List[int],
@@ -294,3 +450,15 @@ def extract_student_info(img: np.ndarray) -> Dict[str, str]:
 # - 마킹 강도 분석
 # - 답안지 품질 평가
 # - 통계 분석 (정답률, 난이도 등)
+
+
+# numba 커널 사전 컴파일 (첫 요청 지연 방지)
+# get_bubble_rects의 좌표 배열과 같은 타입(읽기 전용 int32)으로 컴파일
+if NUMBA_AVAILABLE:
+    _warmup_coords = np.zeros((1, 1), dtype=np.int32)
+    _warmup_coords.setflags(write=False)
+    _roi_density_kernel(
+        np.zeros((4, 4), dtype=np.uint8),
+        _warmup_coords, _warmup_coords, _warmup_coords, _warmup_coords
+    )
+    del _warmup_coords
@@ -6,8 +6,13 @@ import cv2
 import numpy as np
 from typing import List, Dict, Tuple, Optional, Any
 import logging
-import gc
-from app.core.omr_utils import get_bubble_roi, is_bubble_marked, GRID_CONFIG
+from app.core.omr_utils import (
+    get_bubble_roi,
+    get_bubble_rects,
+    binarize_sheet,
+    compute_bubble_densities
+)
+from app.core.memory_optimizer import collect_if_memory_high
 
 logger = logging.getLogger(__name__)
 
@@ -32,67 +37,67 @@ def detect_bubbles_batch_optimized(
     if len(img.shape) == 3:
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     else:
-        gray = img.copy()
+        # 읽기 전용으로만 사용하므로 복사하지 않음
+        gray = img
 
     img_height, img_width = gray.shape
     answers = {}
 
+    # 전역 Otsu 이진화 (1회, detect_bubbles와 동일한 판정 기준)
+    binary = binarize_sheet(gray)
+
+    # 225개 ROI 합산을 적분 영상(또는 numba 커널)으로 한 번에 계산한 뒤
+    # 이진 이미지는 바로 해제하고, 배치 루프는 (45, 5) 결과만 참조
+    densities = compute_bubble_densities(binary, get_bubble_rects(img_height, img_width))
+    del binary
+
     # 45개 문제를 배치로 나눠서 처리
     total_questions = 45
     batches = (total_questions + batch_size - 1) // batch_size  # 올림
 
-    logger.info(f"메모리 최적화 모드: {total_questions}개 문제를 {batches}개 배치로 처리")
+    logger.info("메모리 최적화 모드: %d개 문제를 %d개 배치로 처리", total_questions, batches)
 
     for batch_idx in range(batches):
         start_q = batch_idx * batch_size + 1
         end_q = min((batch_idx + 1) * batch_size, total_questions) + 1
 
-        logger.debug(f"배치 {batch_idx + 1}/{batches}: 문제 {start_q}~{end_q-1}")
+        logger.debug("배치 %d/%d: 문제 %d~%d", batch_idx + 1, batches, start_q, end_q - 1)
 
         # 배치 내 문제 처리
         for question in range(start_q, end_q):
+            row = densities[question - 1]
             marked_options = []
-            all_densities = []
 
             # 5개 선택지 순회
             for option in range(1, 6):
-                try:
-                    x, y, width, height = get_bubble_roi(img_height, img_width, question, option)
-                    is_marked, density = is_bubble_marked(gray, x, y, width, height, threshold)
-
-                    all_densities.append((option, density))
-
-                    if is_marked:
-                        marked_options.append((option, density))
-
-                except Exception as e:
-                    logger.error(f"문제 {question}, 선택지 {option} 처리 중 오류: {str(e)}")
+                density = float(row[option - 1])
+                if density > threshold:
+                    marked_options.append((option, density))
 
             # 마킹된 선택지 처리
             if len(marked_options) == 0:
                 answers[question] = None
             elif len(marked_options) == 1:
                 answers[question] = marked_options[0][0]
-                logger.debug(f"문제 {question}: {marked_options[0][0]}번 마킹 (어두움: {marked_options[0][1]:.3f})")
+                logger.debug("문제 %d: %d번 마킹 (어두움: %.3f)", question, marked_options[0][0], marked_options[0][1])
             else:
                 # 중복 마킹 - 가장 어두운 것 선택
                 marked_options.sort(key=lambda x: x[1], reverse=True)
                 answers[question] = marked_options[0][0]
 
+                # 전체 선택지 내역은 경고 로그용으로 이 경우에만 생성
                 marked_details = ", ".join([f"{opt}번:{density:.3f}" for opt, density in marked_options])
-                all_details = ", ".join([f"{opt}:{density:.3f}" for opt, density in all_densities])
+                all_details = ", ".join([f"{opt}:{row[opt - 1]:.3f}" for opt in range(1, 6)])
 
-                logger.warning(f"문제 {question}: 중복 마킹 감지 - 마킹됨:[{marked_details}] | "
-                              f"전체:[{all_details}] | 선택: {marked_options[0][0]}번")
+                logger.warning("문제 %d: 중복 마킹 감지 - 마킹됨:[%s] | 전체:[%s] | 선택: %d번",
+                               question, marked_details, all_details, marked_options[0][0])
 
-        # 배치마다 메모리 정리
-        if batch_idx < batches - 1:
-            gc.collect()
-            logger.debug(f"배치 {batch_idx + 1} 처리 완료, 메모리 정리")
+        # 메모리 압박이 있을 때만 정리
+        if batch_idx < batches - 1 and collect_if_memory_high():
+            logger.debug("배치 %d 처리 완료, 메모리 정리", batch_idx + 1)
 
-    # 최종 메모리 정리
     del gray
-    gc.collect()
+    del densities
 
     return answers
 
@@ -172,9 +177,6 @@ def grade_omr_sheet_memory_optimized(
         "batch_size": batch_size
     }
 
-    # 메모리 정리
-    gc.collect()
-
     return result
 
 
@@ -2,31 +2,87 @@
 이미지 처리 동시 실행 제한 (1GB RAM 최적화)
 """
 import asyncio
+import os
 import time
 import logging
-from typing import Callable, Any
+from typing import Callable, Any, Optional
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
-# 동시에 1개만 처리하도록 제한 (1GB RAM 최적화)
-processing_semaphore = asyncio.Semaphore(1)
-
 # 최대 대기 시간 (초)
 MAX_WAIT_TIME = 120  # 2분
 
 # 대기열 크기 제한
 MAX_QUEUE_SIZE = 10
 
+# 배치 엔드포인트 동시 처리 수 (이미지당 수십 MB를 사용하므로 메모리 제한을 고려해 작게 유지)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(min(2, os.cpu_count() or 1))))
+
 
 class ProcessingLimiter:
     """
     이미지 처리 요청을 순차적으로 처리하는 제한자
+
+    단일 워커가 asyncio.Queue에서 요청을 하나씩 꺼내 실행 (동시에 1개만 처리, 1GB RAM 최적화).
+    대기열 길이는 큐가 직접 관리하므로 별도 카운터가 필요 없음
     """
 
     def __init__(self):
         self.current_processing = 0
-        self.queue_size = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_task: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        """
+        실행 중인 이벤트 루프에서 큐와 워커 태스크를 (최초 1회) 생성
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=MAX_QUEUE_SIZE)
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = asyncio.create_task(self._worker())
+        return self._queue
+
+    @staticmethod
+    async def _invoke(func: Callable, is_coro: bool, args: tuple, kwargs: dict) -> Any:
+        if is_coro:
+            return await func(*args, **kwargs)
+        # 동기 함수는 쓰레드에서 실행
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def _worker(self):
+        """
+        대기열에서 요청을 순서대로 꺼내 실행하는 단일 워커
+        """
+        queue = self._queue
+        while True:
+            fut, func, is_coro, args, kwargs, enqueued_at = await queue.get()
+            try:
+                # 대기 중 타임아웃/취소된 요청은 실행하지 않음
+                if fut.done():
+                    continue
+
+                wait_time = time.monotonic() - enqueued_at
+                if wait_time > 1.0:  # 1초 이상 대기한 경우 로그
+                    logger.info("처리 시작 (대기 시간: %.2f초)", wait_time)
+
+                self.current_processing = 1
+                start_process = time.monotonic()
+
+                try:
+                    result = await self._invoke(func, is_coro, args, kwargs)
+                except Exception as e:
+                    if not fut.done():
+                        fut.set_exception(e)
+                else:
+                    process_time = time.monotonic() - start_process
+                    logger.info("처리 완료 (처리 시간: %.2f초)", process_time)
+                    if not fut.done():
+                        fut.set_result(result)
+                finally:
+                    self.current_processing = 0
+            finally:
+                queue.task_done()
 
     async def process_with_limit(
         self,
@@ -41,7 +97,7 @@ class ProcessingLimiter:
         Args:
             func: 실행할 함수
             *args: 함수 인자
-            timeout: 최대 대기 시간 (초)
+            timeout: 최대 대기 시간 (초, 대기 + 처리 시간)
             **kwargs: 함수 키워드 인자
 
         Returns:
@@ -50,50 +106,27 @@ class ProcessingLimiter:
         Raises:
             HTTPException: 대기 시간 초과 또는 대기열 초과
         """
-        # 대기열 크기 확인
-        if self.queue_size >= MAX_QUEUE_SIZE:
-            logger.warning(f"대기열 초과 (현재: {self.queue_size}개)")
+        queue = self._ensure_worker()
+        fut = asyncio.get_running_loop().create_future()
+
+        # 코루틴 여부는 요청당 1회, 큐에 넣기 전에 판정 (워커의 직렬 구간에서 제외)
+        # 라우터는 요청마다 새 클로저를 넘기므로 함수별 캐시는 적중하지 않아 사용하지 않음
+        is_coro = asyncio.iscoroutinefunction(func)
+
+        try:
+            queue.put_nowait((fut, func, is_coro, args, kwargs, time.monotonic()))
+        except asyncio.QueueFull:
+            logger.warning("대기열 초과 (현재: %d개)", queue.qsize())
             raise HTTPException(
                 status_code=503,
-                detail=f"서버가 혼잡합니다. 잠시 후 다시 시도해주세요. (대기 중: {self.queue_size}개)"
+                detail=f"서버가 혼잡합니다. 잠시 후 다시 시도해주세요. (대기 중: {queue.qsize()}개)"
             )
 
-        self.queue_size += 1
-        start_wait = time.time()
-
         try:
-            # 타임아웃 적용
-            async with asyncio.timeout(timeout):
-                # 세마포어 획득 대기
-                async with processing_semaphore:
-                    wait_time = time.time() - start_wait
-
-                    if wait_time > 1.0:  # 1초 이상 대기한 경우 로그
-                        logger.info(f"처리 시작 (대기 시간: {wait_time:.2f}초)")
-
-                    self.current_processing += 1
-                    self.queue_size -= 1
-
-                    start_process = time.time()
-
-                    try:
-                        # 함수가 코루틴인지 확인
-                        if asyncio.iscoroutinefunction(func):
-                            result = await func(*args, **kwargs)
-                        else:
-                            # 동기 함수는 쓰레드에서 실행
-                            result = await asyncio.to_thread(func, *args, **kwargs)
-
-                        process_time = time.time() - start_process
-                        logger.info(f"처리 완료 (처리 시간: {process_time:.2f}초)")
-
-                        return result
-                    finally:
-                        self.current_processing -= 1
-
+            # 타임아웃 시 future가 취소되어 워커가 건너뜀
+            return await asyncio.wait_for(fut, timeout)
         except asyncio.TimeoutError:
-            self.queue_size -= 1
-            logger.error(f"처리 대기 시간 초과 ({timeout}초)")
+            logger.error("처리 대기 시간 초과 (%s초)", timeout)
             raise HTTPException(
                 status_code=503,
                 detail=f"대기 시간 초과 ({timeout}초). 서버가 혼잡합니다."
@@ -101,8 +134,7 @@ class ProcessingLimiter:
         except HTTPException:
             raise
         except Exception as e:
-            self.queue_size -= 1
-            logger.error(f"처리 중 오류: {str(e)}")
+            logger.error("처리 중 오류: %s", e)
             raise
 
     def get_status(self) -> dict:
@@ -114,10 +146,32 @@ class ProcessingLimiter:
         """
         return {
             "processing": self.current_processing,
-            "waiting": self.queue_size,
+            "waiting": self._queue.qsize() if self._queue is not None else 0,
             "max_queue_size": MAX_QUEUE_SIZE
         }
 
 
 # 전역 인스턴스
 limiter = ProcessingLimiter()
+
+# 배치 엔드포인트 공용 세마포어 (이벤트 루프별로 최초 사용 시 생성)
+_batch_semaphore: Optional[asyncio.Semaphore] = None
+_batch_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_batch_semaphore() -> asyncio.Semaphore:
+    """
+    프로세스 전체 배치 동시 처리 세마포어 반환
+    정렬/채점 배치 요청이 모두 이 세마포어를 공유하므로 동시에 여러 배치가 들어와도
+    스레드에서 처리 중인 이미지는 최대 BATCH_CONCURRENCY장
+
+    Returns:
+        asyncio.Semaphore: 공용 세마포어
+    """
+    global _batch_semaphore, _batch_semaphore_loop
+
+    loop = asyncio.get_running_loop()
+    if _batch_semaphore is None or _batch_semaphore_loop is not loop:
+        _batch_semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+        _batch_semaphore_loop = loop
+    return _batch_semaphore
@@ -3,12 +3,23 @@
 알림톡 발송을 위한 센드온 API 통신 로직
 """
 import os
+import re
+import asyncio
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 import base64
+from functools import lru_cache
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 
+# httpx (선택사항): 비동기 HTTP 클라이언트, 미설치 시 requests 세션을 스레드에서 사용
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
 # 환경 변수 로드
 load_dotenv()
 
@@ -19,6 +30,32 @@ SENDON_ID = os.getenv("SENDON_ID", "")
 SENDON_API_KEY = os.getenv("SENDON_API_KEY", "")
 SENDON_API_BASE_URL = "https://api.sendon.io"
 
+# Basic 인증 헤더 (모듈 로드 시 1회만 인코딩)
+# 형식: base64(SENDON_ID:SENDON_API_KEY)
+_AUTH_HEADER = (
+    "Basic " + base64.b64encode(f"{SENDON_ID}:{SENDON_API_KEY}".encode()).decode()
+    if SENDON_ID and SENDON_API_KEY else None
+)
+
+# 휴대폰 번호 형식: 01로 시작하는 숫자 10-11자리 (010, 011, 016, 017, 018, 019)
+_PHONE_PATTERN = re.compile(r"01[0-9]{8,9}")
+
+# 공통 요청 헤더
+_BASE_HEADERS = {
+    "Authorization": _AUTH_HEADER,
+    "Content-Type": "application/json"
+}
+
+# 연결 재사용 세션 (keep-alive로 매 호출 TCP/TLS 핸드셰이크 생략)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+# 비동기 클라이언트 (첫 호출 시 생성, 이벤트 루프 안에서 만들어야 하므로 지연 생성)
+_ASYNC_CLIENT: Optional["httpx.AsyncClient"] = None
+
+ALIMTOK_URL = f"{SENDON_API_BASE_URL}/v2/messages/kakao/alim-talk"
+REQUEST_TIMEOUT = 30
+
 
 class SendonAPIException(Exception):
     """센드온 API 호출 중 발생하는 예외"""
@@ -60,25 +97,124 @@ def send_alimtok(
     Raises:
         SendonAPIException: API 호출 실패 시
     """
-    if not SENDON_ID or not SENDON_API_KEY:
+    payload = _build_payload(send_profile_id, template_id, to, reservation, use_credit, fallback)
+
+    try:
+        logger.info("알림톡 발송 요청: 템플릿ID=%s, 수신자 수=%d", template_id, len(to))
+
+        # API 호출
+        response = _SESSION.post(ALIMTOK_URL, json=payload, headers=_BASE_HEADERS, timeout=REQUEST_TIMEOUT)
+
+        return _check_response(response.json())
+
+    except requests.exceptions.RequestException as e:
+        logger.error("센드온 API 호출 중 네트워크 오류: %s", e)
         raise SendonAPIException(
             code=500,
-            message="SENDON_ID 또는 SENDON_API_KEY 환경 변수가 설정되지 않았습니다."
+            message=f"API 호출 중 네트워크 오류가 발생했습니다: {str(e)}"
+        )
+    except ValueError as e:
+        logger.error("센드온 API 응답 파싱 오류: %s", e)
+        raise SendonAPIException(
+            code=500,
+            message=f"API 응답 파싱 중 오류가 발생했습니다: {str(e)}"
         )
 
-    # API 엔드포인트
-    url = f"{SENDON_API_BASE_URL}/v2/messages/kakao/alim-talk"
 
-    # Basic 인증을 위한 base64 인코딩
-    # 형식: base64(SENDON_ID:SENDON_API_KEY)
-    credentials = f"{SENDON_ID}:{SENDON_API_KEY}"
-    encoded_credentials = base64.b64encode(credentials.encode()).decode()
+async def send_alimtok_async(
+    send_profile_id: str,
+    template_id: str,
+    to: list,
+    reservation: Optional[Dict[str, Any]] = None,
+    use_credit: bool = True,
+    fallback: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    send_alimtok의 비동기 버전
+
+    httpx.AsyncClient로 이벤트 루프를 막지 않고 호출하므로 동시 발송 요청이
+    스레드 풀 크기에 묶이지 않습니다. httpx 미설치 시 send_alimtok을 스레드에서 실행합니다.
+
+    Args:
+        send_alimtok과 동일
+
+    Returns:
+        센드온 API 응답 데이터
+
+    Raises:
+        SendonAPIException: API 호출 실패 시
+    """
+    if not HTTPX_AVAILABLE:
+        return await asyncio.to_thread(
+            send_alimtok, send_profile_id, template_id, to, reservation, use_credit, fallback
+        )
+
+    payload = _build_payload(send_profile_id, template_id, to, reservation, use_credit, fallback)
+
+    try:
+        logger.info("알림톡 발송 요청: 템플릿ID=%s, 수신자 수=%d", template_id, len(to))
+
+        response = await _get_async_client().post(ALIMTOK_URL, json=payload)
+
+        return _check_response(response.json())
+
+    except httpx.HTTPError as e:
+        logger.error("센드온 API 호출 중 네트워크 오류: %s", e)
+        raise SendonAPIException(
+            code=500,
+            message=f"API 호출 중 네트워크 오류가 발생했습니다: {str(e)}"
+        )
+    except ValueError as e:
+        logger.error("센드온 API 응답 파싱 오류: %s", e)
+        raise SendonAPIException(
+            code=500,
+            message=f"API 응답 파싱 중 오류가 발생했습니다: {str(e)}"
+        )
 
-    # 요청 헤더
-    headers = {
-        "Authorization": f"Basic {encoded_credentials}",
-        "Content-Type": "application/json"
-    }
+
+async def close_async_client() -> None:
+    """
+    비동기 HTTP 클라이언트 종료 (애플리케이션 종료 시 호출)
+    """
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.aclose()
+        _ASYNC_CLIENT = None
+
+
+def _get_async_client() -> "httpx.AsyncClient":
+    """
+    keep-alive 연결을 재사용하는 모듈 단위 httpx.AsyncClient 반환
+    """
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        _ASYNC_CLIENT = httpx.AsyncClient(
+            headers=_BASE_HEADERS,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=16)
+        )
+    return _ASYNC_CLIENT
+
+
+def _build_payload(
+    send_profile_id: str,
+    template_id: str,
+    to: list,
+    reservation: Optional[Dict[str, Any]],
+    use_credit: bool,
+    fallback: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    인증 설정 확인 후 알림톡 발송 요청 바디 구성
+
+    Raises:
+        SendonAPIException: 인증 환경 변수가 설정되지 않은 경우
+    """
+    if _AUTH_HEADER is None:
+        raise SendonAPIException(
+            code=500,
+            message="SENDON_ID 또는 SENDON_API_KEY 환경 변수가 설정되지 않았습니다."
+        )
 
     # 요청 바디 구성
     payload = {
@@ -95,63 +231,44 @@ def send_alimtok(
     if fallback:
         payload["fallback"] = fallback
 
-    try:
-        logger.info(f"알림톡 발송 요청: 템플릿ID={template_id}, 수신자 수={len(to)}")
-
-        # API 호출
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
-
-        # 응답 데이터 파싱
-        response_data = response.json()
+    return payload
 
-        # 센드온 API는 항상 HTTP 200으로 응답하므로, body의 code로 성공/실패 판단
-        code = response_data.get("code", 500)
-        message = response_data.get("message", "알 수 없는 오류")
 
-        if code != 200:
-            logger.error(f"알림톡 발송 실패: [{code}] {message}")
-            raise SendonAPIException(
-                code=code,
-                message=message,
-                response_data=response_data
-            )
+def _check_response(response_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    센드온 응답 body의 code로 성공/실패 판단
 
-        logger.info(f"알림톡 발송 성공: {message}")
-        return response_data
+    Raises:
+        SendonAPIException: code가 200이 아닌 경우
+    """
+    # 센드온 API는 항상 HTTP 200으로 응답하므로, body의 code로 성공/실패 판단
+    code = response_data.get("code", 500)
+    message = response_data.get("message", "알 수 없는 오류")
 
-    except requests.exceptions.RequestException as e:
-        logger.error(f"센드온 API 호출 중 네트워크 오류: {str(e)}")
+    if code != 200:
+        logger.error("알림톡 발송 실패: [%s] %s", code, message)
         raise SendonAPIException(
-            code=500,
-            message=f"API 호출 중 네트워크 오류가 발생했습니다: {str(e)}"
-        )
-    except ValueError as e:
-        logger.error(f"센드온 API 응답 파싱 오류: {str(e)}")
-        raise SendonAPIException(
-            code=500,
-            message=f"API 응답 파싱 중 오류가 발생했습니다: {str(e)}"
+            code=code,
+            message=message,
+            response_data=response_data
         )
 
+    logger.info("알림톡 발송 성공: %s", message)
+    return response_data
+
 
+@lru_cache(maxsize=4096)
 def validate_phone_number(phone: str) -> bool:
     """
     전화번호 유효성 검사
 
+    순수 함수이므로 결과를 캐싱 (배치 내 반복 번호는 dict 조회 1회로 처리)
+
     Args:
         phone: 전화번호 (예: "01012345678")
 
     Returns:
         유효한 전화번호인 경우 True, 그렇지 않으면 False
     """
-    # 기본 검증: 숫자만, 10-11자리
-    if not phone.isdigit():
-        return False
-
-    if len(phone) not in [10, 11]:
-        return False
-
-    # 휴대폰 번호 형식: 010, 011, 016, 017, 018, 019로 시작
-    if phone.startswith("01"):
-        return True
-
-    return False
+    # 숫자만, 10-11자리, 01로 시작 (미리 컴파일한 정규식으로 한 번에 검사)
+    return _PHONE_PATTERN.fullmatch(phone) is not None
@@ -0,0 +1,73 @@
+"""
+업로드 크기 제한 유틸리티
+큰 파일을 메모리로 읽기 전에 거부하여 OOM과 다른 요청의 처리 지연을 방지
+"""
+import os
+import logging
+from fastapi import UploadFile, HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+# 파일 1개당 최대 크기 (기본값: 30MB)
+MAX_UPLOAD_FILE_SIZE = int(os.getenv("MAX_UPLOAD_FILE_SIZE", str(30 * 1024 * 1024)))
+
+# 요청 본문 전체 최대 크기 (기본값: 300MB, 배치 업로드 기준)
+MAX_REQUEST_BODY_SIZE = int(os.getenv("MAX_REQUEST_BODY_SIZE", str(300 * 1024 * 1024)))
+
+# 제한 검사 읽기 단위
+READ_CHUNK_SIZE = 1 << 20
+
+
+def _too_large(upload: UploadFile, limit: int) -> HTTPException:
+    logger.warning("업로드 크기 초과: %s (제한 %dMB)", upload.filename, limit // (1024 * 1024))
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"파일 크기는 최대 {limit // (1024 * 1024)}MB까지 가능합니다: {upload.filename}"
+    )
+
+
+def check_upload_size(upload: UploadFile, limit: int = MAX_UPLOAD_FILE_SIZE) -> None:
+    """
+    업로드 파일 크기 검사 (파일 객체를 그대로 넘기는 경로용, 읽지 않고 검사)
+
+    Args:
+        upload: 업로드 파일
+        limit: 최대 크기 (바이트)
+
+    Raises:
+        HTTPException: 413, 크기 초과 시
+    """
+    if upload.size is not None and upload.size > limit:
+        raise _too_large(upload, limit)
+
+
+async def read_upload_bounded(upload: UploadFile, limit: int = MAX_UPLOAD_FILE_SIZE) -> bytes:
+    """
+    크기 제한을 지키며 업로드 파일 읽기
+    크기를 알면 읽기 전에 거부하고, 모르면 1MB 단위로 읽으며 누적 크기를 검사
+
+    Args:
+        upload: 업로드 파일
+        limit: 최대 크기 (바이트)
+
+    Returns:
+        파일 바이트 데이터
+
+    Raises:
+        HTTPException: 413, 크기 초과 시
+    """
+    check_upload_size(upload, limit)
+    if upload.size is not None:
+        return await upload.read()
+
+    size = 0
+    chunks = []
+    while True:
+        chunk = await upload.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            raise _too_large(upload, limit)
+        chunks.append(chunk)
+    return b"".join(chunks)
@@ -0,0 +1,61 @@
+"""
+요청 본문 크기 제한 미들웨어
+"""
+from starlette.exceptions import HTTPException
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BodySizeLimitMiddleware:
+    """
+    요청 본문이 제한을 넘으면 413으로 거부하는 ASGI 미들웨어
+
+    Content-Length가 있으면 본문을 받기 전에 바로 거부하고(숫자가 아니면 400),
+    chunked 전송이면 수신한 바이트를 누적하며 초과 시 중단합니다.
+    (BaseHTTPMiddleware를 쓰지 않아 본문 스트리밍을 그대로 유지)
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    # 숫자가 아닌 Content-Length는 잘못된 요청으로 처리
+                    response = PlainTextResponse("Invalid Content-Length", status_code=400)
+                    await response(scope, receive, send)
+                    return
+                if content_length > self.max_body_size:
+                    logger.warning(
+                        "요청 본문 크기 초과: %s %s (%s bytes)",
+                        scope["method"], scope["path"], value.decode()
+                    )
+                    response = PlainTextResponse("Request body too large", status_code=413)
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # 폼 파싱 중 발생하므로 라우트의 예외 처리기가 413 응답으로 변환
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
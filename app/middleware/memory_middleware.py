@@ -22,34 +22,34 @@ class MemoryLoggingMiddleware(BaseHTTPMiddleware):
         if request.url.path == "/health":
             return await call_next(request)
 
-        # 요청 전 메모리 측정
-        memory_before = get_memory_usage()
-        start_time = time.time()
+        # INFO 로그가 꺼져 있으면 요청 전 측정과 문자열 포맷 생략
+        log_enabled = logger.isEnabledFor(logging.INFO)
+
+        # 요청 전 메모리 측정 (get_memory_usage는 TTL 캐시된 샘플을 반환)
+        memory_before = get_memory_usage() if log_enabled else None
+        start_time = time.perf_counter()
 
         # 요청 처리
         response: Response = await call_next(request)
 
         # 요청 후 메모리 측정
         memory_after = get_memory_usage()
-        process_time = time.time() - start_time
-
-        # 메모리 변화량 계산
-        memory_delta = memory_after["rss_mb"] - memory_before["rss_mb"]
 
-        # 로그 출력
-        logger.info(
-            f"[{request.method} {request.url.path}] "
-            f"처리시간: {process_time:.2f}s | "
-            f"메모리: {memory_before['rss_mb']}MB → {memory_after['rss_mb']}MB "
-            f"({'+' if memory_delta >= 0 else ''}{memory_delta:.2f}MB) | "
-            f"사용률: {memory_after['percent']}%"
-        )
+        if log_enabled:
+            process_time = time.perf_counter() - start_time
+            memory_delta = memory_after["rss_mb"] - memory_before["rss_mb"]
+            logger.info(
+                "[%s %s] 처리시간: %.2fs | 메모리: %.2fMB → %.2fMB (%+.2fMB) | 사용률: %.2f%%",
+                request.method, request.url.path, process_time,
+                memory_before["rss_mb"], memory_after["rss_mb"], memory_delta,
+                memory_after["percent"]
+            )
 
         # 메모리 사용률이 80% 이상이면 경고
         if memory_after["percent"] > 80:
             logger.warning(
-                f"⚠️ 높은 메모리 사용률 감지: {memory_after['percent']}% "
-                f"({memory_after['rss_mb']}MB)"
+                "⚠️ 높은 메모리 사용률 감지: %.2f%% (%.2fMB)",
+                memory_after["percent"], memory_after["rss_mb"]
             )
 
         return response
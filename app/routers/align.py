@@ -2,27 +2,29 @@
 이미지 정렬 API 엔드포인트
 """
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import Response
-from typing import Optional
+from fastapi.responses import Response, ORJSONResponse, StreamingResponse
+from typing import Optional, BinaryIO
+import asyncio
+import io
 import logging
-import gc
-from pathlib import Path
+import orjson
 
 from app.core.image_utils import align_scan_to_template
 from app.core.memory_monitor import log_memory_usage
-from app.core.processing_limiter import limiter
+from app.core.memory_optimizer import release_free_memory
+from app.core.processing_limiter import limiter, get_batch_semaphore
 from app.core.logging_config import log_api_call
+from app.core.upload_limits import check_upload_size, read_upload_bounded
+from app.core.default_template import DEFAULT_TEMPLATE_PATH, get_default_template
 
 # 로거 설정
 logger = logging.getLogger(__name__)
 
-# 기본 템플릿 이미지 경로
-DEFAULT_TEMPLATE_PATH = Path(__file__).parent.parent.parent / "omr_card.jpg"
-
 # 라우터 생성
 router = APIRouter(
     prefix="/api/align",
-    tags=["alignment"]
+    tags=["alignment"],
+    default_response_class=ORJSONResponse
 )
 
 
@@ -34,7 +36,7 @@ async def health_check():
     return {
         "status": "ok",
         "service": "Image Alignment API",
-        "methods": ["sift", "contour"]
+        "methods": ["sift", "orb", "contour"]
     }
 
 
@@ -43,8 +45,9 @@ async def health_check():
 async def align_image(
     scan: UploadFile = File(..., description="스캔된 시험지 이미지"),
     template: Optional[UploadFile] = File(None, description="기준 템플릿 이미지 (SIFT 방식에 필요)"),
-    method: str = Form("sift", description="정렬 방식: 'sift' 또는 'contour'"),
+    method: str = Form("sift", description="정렬 방식: 'sift', 'orb' 또는 'contour'"),
     enhance: bool = Form(True, description="이미지 품질 개선 여부"),
+    denoise: bool = Form(False, description="노이즈 제거 여부 (양방향 필터)"),
     return_image: bool = Form(False, description="정렬된 이미지를 바로 반환할지 여부")
 ):
     """
@@ -53,21 +56,22 @@ async def align_image(
     **Parameters:**
     - **scan**: 스캔된 시험지 이미지 파일 (필수)
     - **template**: 기준 템플릿 이미지 파일 (선택사항, 미제공 시 omr_card.jpg 사용)
-    - **method**: 정렬 방식 ('sift' 또는 'contour', 기본값: 'sift')
+    - **method**: 정렬 방식 ('sift', 'orb' 또는 'contour', 기본값: 'sift')
     - **enhance**: 이미지 품질 개선 여부 (기본값: true)
+    - **denoise**: 노이즈 제거 여부 (기본값: false, enhance=true일 때만 적용)
     - **return_image**: true이면 이미지 바이너리를 반환, false이면 JSON 메타데이터 반환
 
     **Returns:**
     - return_image=false: JSON 형식의 메타데이터
-    - return_image=true: PNG 이미지 바이너리
+    - return_image=true: JPEG 이미지 바이너리
 
     **Methods:**
     - **sift**: SIFT + FLANN + Homography (높은 정확도, 템플릿 자동 사용)
+    - **orb**: ORB + Hamming 매칭 + Homography (SIFT보다 빠름, 템플릿 자동 사용)
     - **contour**: 외곽선 검출 + 투시 변환 (빠른 속도, 템플릿 불필요)
     """
-    scan_bytes = None
     template_bytes = None
-    aligned_bytes = None
+    template_key = None
 
     try:
         # 파일 검증
@@ -76,9 +80,7 @@ async def align_image(
                 status_code=400,
                 detail="scan 파라미터는 이미지 파일이어야 합니다"
             )
-
-        # 스캔 이미지 읽기
-        scan_bytes = await scan.read()
+        check_upload_size(scan)
 
         # 템플릿 이미지 읽기
         if template:
@@ -88,34 +90,31 @@ async def align_image(
                     status_code=400,
                     detail="template 파라미터는 이미지 파일이어야 합니다"
                 )
-            template_bytes = await template.read()
-        elif method == "sift":
-            # SIFT 방식이고 템플릿이 없으면 기본 템플릿(omr_card.jpg) 사용
-            if not DEFAULT_TEMPLATE_PATH.exists():
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"기본 템플릿 파일을 찾을 수 없습니다: {DEFAULT_TEMPLATE_PATH}"
-                )
-            template_bytes = DEFAULT_TEMPLATE_PATH.read_bytes()
+            template_bytes = await read_upload_bounded(template)
+        elif method in ("sift", "orb"):
+            # SIFT/ORB 방식이고 템플릿이 없으면 기본 템플릿(omr_card.jpg) 사용
+            template_bytes, template_key = get_default_template()
             logger.info(f"기본 템플릿 사용: {DEFAULT_TEMPLATE_PATH}")
 
         # 정렬 방식 검증
-        if method not in ["sift", "contour"]:
+        if method not in ["sift", "orb", "contour"]:
             raise HTTPException(
                 status_code=400,
-                detail="method는 'sift' 또는 'contour'여야 합니다"
+                detail="method는 'sift', 'orb' 또는 'contour'여야 합니다"
             )
 
         # 이미지 정렬 수행 (순차 처리로 메모리 최적화)
         logger.info(f"이미지 정렬 시작 - 방식: {method}, 품질개선: {enhance}")
 
-        # 실제 처리 함수
+        # 실제 처리 함수 (스캔은 bytes로 읽지 않고 업로드 임시 파일에서 바로 디코딩)
         def process_alignment():
             return align_scan_to_template(
-                scan_bytes=scan_bytes,
+                scan_bytes=scan.file,
                 template_bytes=template_bytes,
+                template_key=template_key,
                 method=method,
-                enhance=enhance
+                enhance=enhance,
+                denoise=denoise
             )
 
         # limiter를 통한 순차 처리
@@ -143,6 +142,8 @@ async def align_image(
                 "note": "정렬된 이미지를 받으려면 return_image=true로 요청하세요"
             }
 
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"입력 검증 오류: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -152,14 +153,6 @@ async def align_image(
             status_code=500,
             detail=f"이미지 정렬 중 오류가 발생했습니다: {str(e)}"
         )
-    finally:
-        # 메모리 정리 (연속 호출 시 메모리 누적 방지)
-        if scan_bytes is not None:
-            del scan_bytes
-        if template_bytes is not None:
-            del template_bytes
-        if aligned_bytes is not None:
-            del aligned_bytes
 
 
 @router.post("/batch")
@@ -168,7 +161,8 @@ async def align_images_batch(
     scans: list[UploadFile] = File(..., description="스캔된 시험지 이미지들"),
     template: Optional[UploadFile] = File(None, description="기준 템플릿 이미지"),
     method: str = Form("sift", description="정렬 방식"),
-    enhance: bool = Form(True, description="이미지 품질 개선 여부")
+    enhance: bool = Form(True, description="이미지 품질 개선 여부"),
+    stream: bool = Form(False, description="완료된 이미지부터 NDJSON으로 스트리밍 응답")
 ):
     """
     여러 스캔 이미지를 배치로 정렬 (최대 100장)
@@ -176,14 +170,17 @@ async def align_images_batch(
     **Parameters:**
     - **scans**: 스캔된 시험지 이미지 파일들 (최대 100개)
     - **template**: 기준 템플릿 이미지 파일 (선택사항, 미제공 시 omr_card.jpg 사용)
-    - **method**: 정렬 방식 ('sift' 또는 'contour', 기본값: 'sift')
-    - **enhance**: 이미지 품질 개선 여부
+    - **method**: 정렬 방식 ('sift', 'orb' 또는 'contour', 기본값: 'sift')
+    - **enhance**: 이미지 품질 개선 여부 (배치 결과에는 이미지가 포함되지 않으므로 적용하지 않음, 호환용)
+    - **stream**: True이면 처리가 끝난 이미지부터 한 줄씩 결과 전송 (기본값: False)
 
     **Returns:**
     - JSON 형식의 배치 처리 결과
+    - stream=True인 경우 NDJSON (application/x-ndjson): 완료 순서대로 이미지별 결과 한 줄씩,
+      마지막 줄은 {"done": true, "total", "successful", "failed"} 요약
 
     **Notes:**
-    - 메모리 효율을 위해 각 이미지는 순차적으로 처리되며 처리 후 즉시 메모리에서 해제됩니다
+    - 이미지는 서버 전체에서 동시에 최대 BATCH_CONCURRENCY장(기본 2)씩 스레드에서 처리되며 처리 후 즉시 메모리에서 해제됩니다
     - 결과에는 메타데이터만 포함되며 이미지 바이트는 저장되지 않습니다
     """
     try:
@@ -194,88 +191,141 @@ async def align_images_batch(
                 status_code=400,
                 detail=f"배치 크기는 최대 {MAX_BATCH_SIZE}개까지 가능합니다 (현재: {len(scans)}개)"
             )
+        # 파일별 크기 제한 (업로드 임시 파일 크기로 읽기 전에 검사)
+        for scan in scans:
+            check_upload_size(scan)
+
         # 템플릿 이미지 읽기
         template_bytes = None
+        template_key = None
         if template:
             # 사용자가 템플릿을 제공한 경우
-            template_bytes = await template.read()
-        elif method == "sift":
-            # SIFT 방식이고 템플릿이 없으면 기본 템플릿(omr_card.jpg) 사용
-            if not DEFAULT_TEMPLATE_PATH.exists():
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"기본 템플릿 파일을 찾을 수 없습니다: {DEFAULT_TEMPLATE_PATH}"
-                )
-            template_bytes = DEFAULT_TEMPLATE_PATH.read_bytes()
+            template_bytes = await read_upload_bounded(template)
+        elif method in ("sift", "orb"):
+            # SIFT/ORB 방식이고 템플릿이 없으면 기본 템플릿(omr_card.jpg) 사용
+            template_bytes, template_key = get_default_template()
             logger.info(f"배치 처리에서 기본 템플릿 사용: {DEFAULT_TEMPLATE_PATH}")
 
         # 배치 시작 전 메모리 상태
         log_memory_usage("[배치 시작] ")
 
-        results = []
-        for idx, scan in enumerate(scans):
-            scan_bytes = None
-            aligned_bytes = None
-
+        total = len(scans)
+        # 다른 배치 요청과 공유 (프로세스 전체에서 동시에 BATCH_CONCURRENCY장만 처리)
+        semaphore = get_batch_semaphore()
+        completed = 0
+        # 워커 스레드에 넘긴 작업의 인덱스 (해당 파일은 워커가 직접 닫음)
+        started = set()
+
+        def align_and_close(scan_file: BinaryIO) -> dict:
+            """
+            스캔 1장 정렬 후 메타데이터 반환 (배치 워커 스레드에서 실행)
+            요청이 취소되어도 스레드는 계속 실행되므로 scan_file은 여기서 직접 닫음
+            """
             try:
-                # 스캔 이미지 읽기
-                scan_bytes = await scan.read()
-
-                # 이미지 정렬 수행
-                aligned_bytes, metadata = align_scan_to_template(
-                    scan_bytes=scan_bytes,
+                # 정렬된 이미지는 배치 결과에 포함하지 않으므로 품질 개선과 인코딩 없이 메타데이터만 유지
+                _, metadata = align_scan_to_template(
+                    scan_bytes=scan_file,
                     template_bytes=template_bytes,
+                    template_key=template_key,
                     method=method,
-                    enhance=enhance
+                    enhance=False,
+                    output_format=None
                 )
-
-                # 결과 저장 (이미지 바이트는 제외, 메타데이터만 저장)
-                results.append({
-                    "index": idx,
-                    "filename": scan.filename,
-                    "success": metadata.get("success", False),
-                    "metadata": metadata
-                })
-
-                logger.info(f"배치 [{idx + 1}/{len(scans)}] {scan.filename} 처리 완료")
-
-            except Exception as e:
-                logger.error(f"배치 [{idx + 1}/{len(scans)}] {scan.filename} 처리 실패: {str(e)}")
-                results.append({
-                    "index": idx,
-                    "filename": scan.filename,
-                    "success": False,
-                    "error": str(e)
-                })
-
             finally:
-                # 메모리 효율: 각 이미지 처리 후 즉시 큰 변수 해제
-                if scan_bytes is not None:
-                    del scan_bytes
-                if aligned_bytes is not None:
-                    del aligned_bytes
-
-                # 10장마다 가비지 컬렉션 수행 (메모리 회수)
-                if (idx + 1) % 10 == 0:
-                    gc.collect()
-                    log_memory_usage(f"[배치 진행 {idx + 1}/{len(scans)}] ")
-
-        # 최종 메모리 정리
-        gc.collect()
+                scan_file.close()
+            return metadata
+
+        async def align_one(idx: int, filename: str, scan_file: BinaryIO) -> dict:
+            nonlocal completed
+            async with semaphore:
+                try:
+                    # 이미지 정렬 수행 (CPU 작업은 스레드에서 실행하여 이벤트 루프 차단 방지)
+                    # 스캔은 bytes로 읽지 않고 업로드 임시 파일에서 스레드 안에서 바로 디코딩
+                    started.add(idx)
+                    metadata = await asyncio.to_thread(align_and_close, scan_file)
+
+                    logger.info(f"배치 [{idx + 1}/{total}] {filename} 처리 완료")
+
+                    # 결과 저장 (이미지 바이트는 제외, 메타데이터만 저장)
+                    return {
+                        "index": idx,
+                        "filename": filename,
+                        "success": metadata.get("success", False),
+                        "metadata": metadata
+                    }
+
+                except Exception as e:
+                    logger.error(f"배치 [{idx + 1}/{total}] {filename} 처리 실패: {str(e)}")
+                    return {
+                        "index": idx,
+                        "filename": filename,
+                        "success": False,
+                        "error": str(e)
+                    }
+
+                finally:
+                    # 10장마다 메모리 상태 로깅 (DEBUG일 때만)
+                    completed += 1
+                    if completed % 10 == 0 and logger.isEnabledFor(logging.DEBUG):
+                        log_memory_usage(f"[배치 진행 {completed}/{total}] ")
+
+        jobs = [(idx, scan.filename, scan.file) for idx, scan in enumerate(scans)]
+
+        if stream:
+            # FastAPI는 엔드포인트가 반환되면(응답 전송 전) 업로드 파일을 닫으므로
+            # 스트리밍 중에도 읽을 수 있도록 임시 파일을 UploadFile에서 분리해 직접 닫음
+            for scan in scans:
+                scan.file = io.BytesIO()
+
+            async def stream_results():
+                tasks = [asyncio.create_task(align_one(*job)) for job in jobs]
+                successful = 0
+                try:
+                    # 완료된 순서대로 한 줄씩 전송 (각 결과의 index로 입력 순서 확인 가능)
+                    for next_done in asyncio.as_completed(tasks):
+                        result = await next_done
+                        successful += result["success"]
+                        yield orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+                    yield orjson.dumps({
+                        "done": True,
+                        "total": total,
+                        "successful": successful,
+                        "failed": total - successful
+                    }) + b"\n"
+                finally:
+                    # 클라이언트 연결이 끊긴 경우 남은 작업 취소
+                    # 스레드에서 읽는 중인 파일은 워커가 닫으므로 시작 전에 취소된 작업의 파일만 닫음
+                    for task in tasks:
+                        task.cancel()
+                    for idx, _, scan_file in jobs:
+                        if idx not in started:
+                            scan_file.close()
+                    release_free_memory()
+                    log_memory_usage("[배치 완료] ")
+
+            return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+        # 입력 순서대로 결과 수집 (동시에 최대 BATCH_CONCURRENCY장 처리)
+        results = await asyncio.gather(*[align_one(*job) for job in jobs])
+
+        # 해제된 버퍼의 빈 페이지를 OS에 반환
+        release_free_memory()
         log_memory_usage("[배치 완료] ")
         logger.info(f"배치 처리 완료 - 최종 메모리 정리 수행")
 
         # 통계 계산
-        successful = sum(1 for r in results if r.get("success", False))
+        successful = sum(r["success"] for r in results)
         failed = len(results) - successful
 
-        return {
+        # jsonable_encoder 순회 없이 orjson으로 바로 직렬화 (최대 100개 메타데이터)
+        return ORJSONResponse({
             "success": True,
             "total": len(results),
             "successful": successful,
             "failed": failed,
             "results": results
-        }
+        })
 
     except HTTPException:
         raise
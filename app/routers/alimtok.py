@@ -3,18 +3,35 @@
 센드온(Sendon) API를 통한 카카오 알림톡 메시지 발송
 """
 from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel, Field, validator
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, ConfigDict, ValidationInfo, field_validator
 from typing import List, Optional, Union, Dict, Any
 import logging
 
-from app.core.sendon_utils import send_alimtok, validate_phone_number, SendonAPIException
+from app.core.sendon_utils import (
+    send_alimtok_async,
+    validate_phone_number,
+    SendonAPIException,
+    SENDON_ID,
+    SENDON_API_KEY
+)
 
 logger = logging.getLogger(__name__)
 
+# 헬스체크 응답 (환경 변수는 프로세스 수명 동안 바뀌지 않으므로 import 시 1회만 구성)
+_HEALTH_BODY = {
+    "status": "healthy",
+    "service": "alimtok",
+    "sendon_id_configured": bool(SENDON_ID),
+    "sendon_api_key_configured": bool(SENDON_API_KEY),
+    "auth_configured": bool(SENDON_ID and SENDON_API_KEY)
+}
+
 router = APIRouter(
     prefix="/api/alimtok",
     tags=["알림톡"],
-    responses={404: {"description": "Not found"}}
+    responses={404: {"description": "Not found"}},
+    default_response_class=ORJSONResponse
 )
 
 
@@ -26,7 +43,8 @@ class RecipientSimple(BaseModel):
     """수신자 정보 (변수 없는 경우)"""
     phone: str = Field(..., description="수신자 전화번호 (예: 01012345678)")
 
-    @validator('phone')
+    @field_validator('phone')
+    @classmethod
     def validate_phone(cls, v):
         if not validate_phone_number(v):
             raise ValueError('올바른 전화번호 형식이 아닙니다 (예: 01012345678)')
@@ -41,7 +59,8 @@ class RecipientWithVariables(BaseModel):
         description="템플릿 변수 (예: {'#{고객명}': '홍길동', '#{날짜}': '2024-01-01'})"
     )
 
-    @validator('phone')
+    @field_validator('phone')
+    @classmethod
     def validate_phone(cls, v):
         if not validate_phone_number(v):
             raise ValueError('올바른 전화번호 형식이 아닙니다 (예: 01012345678)')
@@ -86,15 +105,17 @@ class CustomFallback(BaseModel):
         description="이미지 ID 배열 (MMS의 경우 필수, 최대 3개)"
     )
 
-    @validator('type')
+    @field_validator('type')
+    @classmethod
     def validate_type(cls, v):
         if v not in ['SMS', 'LMS', 'MMS']:
             raise ValueError('type은 SMS, LMS, MMS 중 하나여야 합니다')
         return v
 
-    @validator('images')
-    def validate_images(cls, v, values):
-        if values.get('type') == 'MMS' and not v:
+    @field_validator('images')
+    @classmethod
+    def validate_images(cls, v, info: ValidationInfo):
+        if info.data.get('type') == 'MMS' and not v:
             raise ValueError('MMS 타입의 경우 images 필드가 필수입니다')
         if v and len(v) > 3:
             raise ValueError('이미지는 최대 3개까지 첨부 가능합니다')
@@ -113,15 +134,17 @@ class FallbackSettings(BaseModel):
         description="대체문자 상세 설정 (CUSTOM 타입의 경우 필수)"
     )
 
-    @validator('fallback_type')
+    @field_validator('fallback_type')
+    @classmethod
     def validate_fallback_type(cls, v):
         if v not in ['NONE', 'TEMPLATE', 'CUSTOM']:
             raise ValueError('fallbackType은 NONE, TEMPLATE, CUSTOM 중 하나여야 합니다')
         return v
 
-    @validator('custom')
-    def validate_custom(cls, v, values):
-        if values.get('fallback_type') == 'CUSTOM' and not v:
+    @field_validator('custom')
+    @classmethod
+    def validate_custom(cls, v, info: ValidationInfo):
+        if info.data.get('fallback_type') == 'CUSTOM' and not v:
             raise ValueError('CUSTOM 타입의 경우 custom 필드가 필수입니다')
         return v
 
@@ -140,8 +163,8 @@ class AlimtokSendRequest(BaseModel):
     )
     to: List[Union[str, RecipientWithVariables]] = Field(
         ...,
-        min_items=1,
-        max_items=1000,
+        min_length=1,
+        max_length=1000,
         description="수신자 정보 목록 (최대 1,000명). 변수 없으면 전화번호 문자열 배열, 변수 있으면 객체 배열"
     )
     reservation: Optional[ReservationSettings] = Field(
@@ -158,16 +181,15 @@ class AlimtokSendRequest(BaseModel):
         description="대체문자 설정 (선택)"
     )
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
-    @validator('to')
+    @field_validator('to')
+    @classmethod
     def validate_recipients(cls, v):
-        # 전화번호 문자열인 경우 유효성 검사
+        # 전화번호 문자열인 경우 유효성 검사 (객체 수신자는 RecipientWithVariables에서 검사)
         for item in v:
-            if isinstance(item, str):
-                if not validate_phone_number(item):
-                    raise ValueError(f'올바른 전화번호 형식이 아닙니다: {item}')
+            if isinstance(item, str) and not validate_phone_number(item):
+                raise ValueError(f'올바른 전화번호 형식이 아닙니다: {item}')
         return v
 
 
@@ -217,17 +239,11 @@ async def send_alimtok_message(request: AlimtokSendRequest):
     정보성 메시지를 사전 승인된 템플릿으로 발송합니다.
     """
     try:
-        # 수신자 정보 변환
-        recipients = []
-        for recipient in request.to:
-            if isinstance(recipient, str):
-                recipients.append(recipient)
-            else:
-                # RecipientWithVariables 객체를 dict로 변환
-                recipients.append({
-                    "phone": recipient.phone,
-                    "variables": recipient.variables
-                })
+        # 수신자 정보 변환 (RecipientWithVariables는 pydantic 직렬화로 {"phone", "variables"} dict 생성)
+        recipients = [
+            recipient if isinstance(recipient, str) else recipient.model_dump()
+            for recipient in request.to
+        ]
 
         # 예약 설정 변환
         reservation = None
@@ -251,8 +267,8 @@ async def send_alimtok_message(request: AlimtokSendRequest):
                 if custom.images:
                     fallback["custom"]["images"] = custom.images
 
-        # 센드온 API 호출
-        result = send_alimtok(
+        # 센드온 API 호출 (비동기 클라이언트로 이벤트 루프 차단 없이 발송)
+        result = await send_alimtok_async(
             send_profile_id=request.send_profile_id,
             template_id=request.template_id,
             to=recipients,
@@ -261,7 +277,13 @@ async def send_alimtok_message(request: AlimtokSendRequest):
             fallback=fallback
         )
 
-        return AlimtokSendResponse(**result)
+        # 센드온 응답은 _check_response에서 code/message를 이미 확인했으므로 Pydantic 재검증 없이 바로 직렬화
+        # (Response를 직접 반환하면 response_model은 OpenAPI 스키마에만 사용됨)
+        return ORJSONResponse({
+            "code": result["code"],
+            "message": result.get("message", ""),
+            "data": result.get("data")
+        })
 
     except SendonAPIException as e:
         # 센드온 API 오류
@@ -295,14 +317,4 @@ async def health_check():
     """
     알림톡 서비스의 상태를 확인합니다.
     """
-    import os
-    sendon_id = os.getenv("SENDON_ID", "")
-    sendon_api_key = os.getenv("SENDON_API_KEY", "")
-
-    return {
-        "status": "healthy",
-        "service": "alimtok",
-        "sendon_id_configured": bool(sendon_id),
-        "sendon_api_key_configured": bool(sendon_api_key),
-        "auth_configured": bool(sendon_id and sendon_api_key)
-    }
+    return _HEALTH_BODY
@@ -2,17 +2,22 @@
 OMR 채점 API 엔드포인트
 """
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import Optional, List
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import Optional, List, Sequence, BinaryIO
+from functools import lru_cache
+import asyncio
+import io
 import logging
-import json
-import gc
+import orjson
 
-from app.core.image_utils import bytes_to_cv2, align_scan_to_template
+from app.core.image_utils import align_scan_to_template
 from app.core.omr_utils import detect_bubbles, grade_omr_sheet
 from app.core.memory_monitor import log_memory_usage
-from app.core.processing_limiter import limiter
+from app.core.memory_optimizer import release_free_memory
+from app.core.processing_limiter import limiter, get_batch_semaphore
 from app.core.logging_config import log_api_call
-from pathlib import Path
+from app.core.upload_limits import check_upload_size, read_upload_bounded
+from app.core.default_template import get_default_template
 
 # 로거 설정
 logger = logging.getLogger(__name__)
@@ -20,12 +25,10 @@ logger = logging.getLogger(__name__)
 # 라우터 생성
 router = APIRouter(
     prefix="/api/grade",
-    tags=["grading"]
+    tags=["grading"],
+    default_response_class=ORJSONResponse
 )
 
-# 기본 템플릿 이미지 경로
-DEFAULT_TEMPLATE_PATH = Path(__file__).parent.parent.parent / "omr_card.jpg"
-
 
 @router.get("/")
 async def health_check():
@@ -45,7 +48,7 @@ async def health_check():
 async def detect_answers(
     scan: UploadFile = File(..., description="스캔된 시험지 이미지"),
     template: Optional[UploadFile] = File(None, description="기준 템플릿 이미지"),
-    method: str = Form("sift", description="정렬 방식: 'sift' 또는 'contour'"),
+    method: str = Form("sift", description="정렬 방식: 'sift', 'orb' 또는 'contour'"),
     threshold: float = Form(0.35, description="마킹 판단 임계값 (0.0~1.0)")
 ):
     """
@@ -54,31 +57,24 @@ async def detect_answers(
     **Parameters:**
     - **scan**: 스캔된 시험지 이미지 (필수)
     - **template**: 기준 템플릿 (선택사항, 미제공 시 omr_card.jpg 사용)
-    - **method**: 정렬 방식 ('sift' 또는 'contour', 기본값: 'sift')
+    - **method**: 정렬 방식 ('sift', 'orb' 또는 'contour', 기본값: 'sift')
     - **threshold**: 마킹 판단 임계값 (기본값: 0.35, 낮을수록 민감)
 
     **Returns:**
     - JSON 형식의 검출 결과
     """
-    scan_bytes = None
     template_bytes = None
-    aligned_bytes = None
-    aligned_img = None
+    template_key = None
 
     try:
-        # 스캔 이미지 읽기
-        scan_bytes = await scan.read()
+        # 스캔 크기 검사 (bytes로 읽지 않고 업로드 임시 파일에서 바로 디코딩)
+        check_upload_size(scan)
 
         # 템플릿 이미지 읽기
         if template:
-            template_bytes = await template.read()
-        elif method == "sift":
-            if not DEFAULT_TEMPLATE_PATH.exists():
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"기본 템플릿 파일을 찾을 수 없습니다: {DEFAULT_TEMPLATE_PATH}"
-                )
-            template_bytes = DEFAULT_TEMPLATE_PATH.read_bytes()
+            template_bytes = await read_upload_bounded(template)
+        elif method in ("sift", "orb"):
+            template_bytes, template_key = get_default_template()
 
         # 이미지 정렬 및 답안 검출 (순차 처리로 메모리 최적화)
         logger.info(f"이미지 정렬 및 답안 검출 시작 - 방식: {method}, 임계값: {threshold}")
@@ -86,30 +82,30 @@ async def detect_answers(
         # 실제 처리 함수
         def process_detection():
             # 이미지 정렬
-            aligned_bytes_result, metadata_result = align_scan_to_template(
-                scan_bytes=scan_bytes,
+            # 채점에만 쓰므로 JPEG 인코딩/디코딩 없이 정렬된 배열을 바로 받음
+            aligned_img_result, metadata_result = align_scan_to_template(
+                scan_bytes=scan.file,
                 template_bytes=template_bytes,
+                template_key=template_key,
                 method=method,
-                enhance=True
+                enhance=True,
+                output_format=None
             )
 
             if not metadata_result.get("success"):
                 raise ValueError("이미지 정렬에 실패했습니다")
 
-            # OpenCV 이미지로 변환
-            aligned_img_result = bytes_to_cv2(aligned_bytes_result)
-
             # 답안 검출
             detected_answers_result = detect_bubbles(aligned_img_result, threshold)
 
-            return aligned_bytes_result, metadata_result, detected_answers_result
+            return metadata_result, detected_answers_result
 
         # limiter를 통한 순차 처리
-        aligned_bytes, metadata, detected_answers = await limiter.process_with_limit(process_detection)
+        metadata, detected_answers = await limiter.process_with_limit(process_detection)
 
         # 응답 생성
-        answered_count = sum(1 for v in detected_answers.values() if v is not None)
-        blank_count = sum(1 for v in detected_answers.values() if v is None)
+        answered_count = sum(v is not None for v in detected_answers.values())
+        blank_count = len(detected_answers) - answered_count
 
         return {
             "success": True,
@@ -123,6 +119,8 @@ async def detect_answers(
             }
         }
 
+    except HTTPException:
+        raise
     except ValueError as e:
         logger.error(f"입력 검증 오류: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -132,16 +130,6 @@ async def detect_answers(
             status_code=500,
             detail=f"답안 검출 중 오류가 발생했습니다: {str(e)}"
         )
-    finally:
-        # 메모리 정리
-        if scan_bytes is not None:
-            del scan_bytes
-        if template_bytes is not None:
-            del template_bytes
-        if aligned_bytes is not None:
-            del aligned_bytes
-        if aligned_img is not None:
-            del aligned_img
 
 
 @router.post("/")
@@ -150,7 +138,7 @@ async def grade_exam(
     scan: UploadFile = File(..., description="스캔된 시험지 이미지"),
     answer_key: str = Form(..., description="정답 리스트 JSON 배열 (45개, 1-indexed)"),
     template: Optional[UploadFile] = File(None, description="기준 템플릿 이미지"),
-    method: str = Form("sift", description="정렬 방식: 'sift' 또는 'contour'"),
+    method: str = Form("sift", description="정렬 방식: 'sift', 'orb' 또는 'contour'"),
     threshold: float = Form(0.35, description="마킹 판단 임계값 (0.0~1.0)"),
     score_per_question: float = Form(1.0, description="문제당 배점")
 ):
@@ -161,43 +149,34 @@ async def grade_exam(
     - **scan**: 스캔된 시험지 이미지 (필수)
     - **answer_key**: 정답 리스트 JSON 배열 (예: "[1,2,3,4,5,1,2,3,...]" - 45개)
     - **template**: 기준 템플릿 (선택사항)
-    - **method**: 정렬 방식 ('sift' 또는 'contour', 기본값: 'sift')
+    - **method**: 정렬 방식 ('sift', 'orb' 또는 'contour', 기본값: 'sift')
     - **threshold**: 마킹 판단 임계값 (기본값: 0.35)
     - **score_per_question**: 문제당 배점 (기본값: 1.0)
 
     **Returns:**
     - JSON 형식의 채점 결과
     """
-    scan_bytes = None
     template_bytes = None
-    aligned_bytes = None
-    aligned_img = None
+    template_key = None
 
     try:
         # 정답 파싱
         try:
-            answer_key_list = json.loads(answer_key)
-            if not isinstance(answer_key_list, list) or len(answer_key_list) != 45:
-                raise ValueError("정답은 45개의 숫자 배열이어야 합니다")
-        except json.JSONDecodeError:
+            answer_key_list = _parse_answer_key(answer_key)
+        except orjson.JSONDecodeError:
             raise HTTPException(
                 status_code=400,
                 detail="answer_key는 유효한 JSON 배열이어야 합니다 (예: [1,2,3,...])"
             )
 
-        # 스캔 이미지 읽기
-        scan_bytes = await scan.read()
+        # 스캔 크기 검사 (bytes로 읽지 않고 업로드 임시 파일에서 바로 디코딩)
+        check_upload_size(scan)
 
         # 템플릿 이미지 읽기
         if template:
-            template_bytes = await template.read()
-        elif method == "sift":
-            if not DEFAULT_TEMPLATE_PATH.exists():
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"기본 템플릿 파일을 찾을 수 없습니다: {DEFAULT_TEMPLATE_PATH}"
-                )
-            template_bytes = DEFAULT_TEMPLATE_PATH.read_bytes()
+            template_bytes = await read_upload_bounded(template)
+        elif method in ("sift", "orb"):
+            template_bytes, template_key = get_default_template()
 
         # 이미지 정렬 및 채점 (순차 처리로 메모리 최적화)
         logger.info(f"이미지 정렬 및 채점 시작 - 방식: {method}, 임계값: {threshold}, 배점: {score_per_question}")
@@ -205,19 +184,19 @@ async def grade_exam(
         # 실제 처리 함수
         def process_grading():
             # 이미지 정렬
-            aligned_bytes_result, metadata_result = align_scan_to_template(
-                scan_bytes=scan_bytes,
+            # 채점에만 쓰므로 JPEG 인코딩/디코딩 없이 정렬된 배열을 바로 받음
+            aligned_img_result, metadata_result = align_scan_to_template(
+                scan_bytes=scan.file,
                 template_bytes=template_bytes,
+                template_key=template_key,
                 method=method,
-                enhance=True
+                enhance=True,
+                output_format=None
             )
 
             if not metadata_result.get("success"):
                 raise ValueError("이미지 정렬에 실패했습니다")
 
-            # OpenCV 이미지로 변환
-            aligned_img_result = bytes_to_cv2(aligned_bytes_result)
-
             # 채점
             grading_result = grade_omr_sheet(
                 aligned_img_result,
@@ -249,16 +228,6 @@ async def grade_exam(
             status_code=500,
             detail=f"채점 중 오류가 발생했습니다: {str(e)}"
         )
-    finally:
-        # 메모리 정리
-        if scan_bytes is not None:
-            del scan_bytes
-        if template_bytes is not None:
-            del template_bytes
-        if aligned_bytes is not None:
-            del aligned_bytes
-        if aligned_img is not None:
-            del aligned_img
 
 
 @router.post("/batch")
@@ -269,7 +238,8 @@ async def grade_exams_batch(
     template: Optional[UploadFile] = File(None, description="기준 템플릿 이미지"),
     method: str = Form("sift", description="정렬 방식"),
     threshold: float = Form(0.35, description="마킹 판단 임계값"),
-    score_per_question: float = Form(1.0, description="문제당 배점")
+    score_per_question: float = Form(1.0, description="문제당 배점"),
+    stream: bool = Form(False, description="완료된 답안지부터 NDJSON으로 스트리밍 응답")
 ):
     """
     여러 OMR 답안지를 배치로 채점 (최대 100장)
@@ -281,12 +251,15 @@ async def grade_exams_batch(
     - **method**: 정렬 방식
     - **threshold**: 마킹 판단 임계값
     - **score_per_question**: 문제당 배점
+    - **stream**: True이면 채점이 끝난 답안지부터 한 줄씩 결과 전송 (기본값: False)
 
     **Returns:**
     - JSON 형식의 배치 채점 결과
+    - stream=True인 경우 NDJSON (application/x-ndjson): 완료 순서대로 답안지별 결과 한 줄씩,
+      마지막 줄은 {"done": true, "total", "successful", "failed", "average_score"} 요약
 
     **Notes:**
-    - 메모리 효율을 위해 각 이미지는 순차적으로 처리되며 처리 후 즉시 메모리에서 해제됩니다
+    - 이미지는 서버 전체에서 동시에 최대 BATCH_CONCURRENCY장(기본 2)씩 스레드에서 처리되며 처리 후 즉시 메모리에서 해제됩니다
     - 결과에는 채점 정보만 포함되며 이미지 바이트는 저장되지 않습니다
     """
     try:
@@ -297,128 +270,163 @@ async def grade_exams_batch(
                 status_code=400,
                 detail=f"배치 크기는 최대 {MAX_BATCH_SIZE}개까지 가능합니다 (현재: {len(scans)}개)"
             )
-        # 정답 파싱
+        # 정답 파싱 (파일 검사보다 먼저 수행하여 잘못된 요청을 바로 거부)
         try:
-            answer_key_list = json.loads(answer_key)
-            if not isinstance(answer_key_list, list) or len(answer_key_list) != 45:
-                raise ValueError("정답은 45개의 숫자 배열이어야 합니다")
-        except json.JSONDecodeError:
+            answer_key_list = _parse_answer_key(answer_key)
+        except orjson.JSONDecodeError:
             raise HTTPException(
                 status_code=400,
                 detail="answer_key는 유효한 JSON 배열이어야 합니다"
             )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # 파일별 크기 제한 (업로드 임시 파일 크기로 읽기 전에 검사)
+        for scan in scans:
+            check_upload_size(scan)
 
         # 템플릿 이미지 읽기
         template_bytes = None
+        template_key = None
         if template:
-            template_bytes = await template.read()
-        elif method == "sift":
-            if not DEFAULT_TEMPLATE_PATH.exists():
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"기본 템플릿 파일을 찾을 수 없습니다: {DEFAULT_TEMPLATE_PATH}"
-                )
-            template_bytes = DEFAULT_TEMPLATE_PATH.read_bytes()
+            template_bytes = await read_upload_bounded(template)
+        elif method in ("sift", "orb"):
+            template_bytes, template_key = get_default_template()
 
         # 배치 시작 전 메모리 상태
         log_memory_usage("[배치 채점 시작] ")
 
-        results = []
-        for idx, scan in enumerate(scans):
-            scan_bytes = None
-            aligned_bytes = None
-            aligned_img = None
-
-            try:
-                # 스캔 이미지 읽기
-                scan_bytes = await scan.read()
-
-                # 이미지 정렬
-                aligned_bytes, metadata = align_scan_to_template(
-                    scan_bytes=scan_bytes,
-                    template_bytes=template_bytes,
-                    method=method,
-                    enhance=True
-                )
-
-                if not metadata.get("success"):
-                    results.append({
+        total = len(scans)
+        # 정렬 배치와 공유 (프로세스 전체에서 동시에 BATCH_CONCURRENCY장만 처리)
+        semaphore = get_batch_semaphore()
+        completed = 0
+        # 워커 스레드에 넘긴 작업의 인덱스 (해당 파일은 워커가 직접 닫음)
+        started = set()
+
+        async def grade_one(idx: int, filename: str, scan_file: BinaryIO) -> dict:
+            nonlocal completed
+
+            async with semaphore:
+                try:
+                    # 정렬 + 채점 (CPU 작업은 스레드에서 실행, OpenCV는 GIL을 해제하므로 병렬 처리됨)
+                    # 스레드 작업은 취소되지 않으므로 파일은 _grade_scan이 처리 후 직접 닫음
+                    started.add(idx)
+                    grading_result = await asyncio.to_thread(
+                        _grade_scan,
+                        scan_file,
+                        template_bytes,
+                        template_key,
+                        method,
+                        answer_key_list,
+                        threshold,
+                        score_per_question
+                    )
+
+                    if grading_result is None:
+                        return {
+                            "index": idx,
+                            "filename": filename,
+                            "success": False,
+                            "error": "이미지 정렬 실패"
+                        }
+
+                    logger.info(
+                        "배치 [%d/%d] %s 채점 완료 - 점수: %s/%s",
+                        idx + 1, total, filename,
+                        grading_result["total_score"], grading_result["max_score"]
+                    )
+
+                    # 결과 저장 (이미지 바이트는 제외, 채점 결과만 저장)
+                    return {
                         "index": idx,
-                        "filename": scan.filename,
+                        "filename": filename,
+                        "success": True,
+                        "grading": grading_result
+                    }
+
+                except Exception as e:
+                    logger.error("배치 [%d/%d] %s 처리 실패: %s", idx + 1, total, filename, e)
+                    return {
+                        "index": idx,
+                        "filename": filename,
                         "success": False,
-                        "error": "이미지 정렬 실패"
-                    })
-                    continue
-
-                # OpenCV 이미지로 변환
-                aligned_img = bytes_to_cv2(aligned_bytes)
-
-                # 채점 수행
-                grading_result = grade_omr_sheet(
-                    aligned_img,
-                    answer_key_list,
-                    threshold,
-                    score_per_question
-                )
-
-                # 결과 저장 (이미지 바이트는 제외, 채점 결과만 저장)
-                results.append({
-                    "index": idx,
-                    "filename": scan.filename,
-                    "success": True,
-                    "grading": grading_result
-                })
-
-                logger.info(f"배치 [{idx + 1}/{len(scans)}] {scan.filename} 채점 완료 "
-                           f"- 점수: {grading_result['total_score']}/{grading_result['max_score']}")
-
-            except Exception as e:
-                logger.error(f"배치 [{idx + 1}/{len(scans)}] {scan.filename} 처리 실패: {str(e)}")
-                results.append({
-                    "index": idx,
-                    "filename": scan.filename,
-                    "success": False,
-                    "error": str(e)
-                })
-
-            finally:
-                # 메모리 효율: 각 이미지 처리 후 즉시 큰 변수 해제
-                if scan_bytes is not None:
-                    del scan_bytes
-                if aligned_bytes is not None:
-                    del aligned_bytes
-                if aligned_img is not None:
-                    del aligned_img
-
-                # 10장마다 가비지 컬렉션 수행 (메모리 회수)
-                if (idx + 1) % 10 == 0:
-                    gc.collect()
-                    log_memory_usage(f"[배치 채점 진행 {idx + 1}/{len(scans)}] ")
-
-        # 최종 메모리 정리
-        gc.collect()
+                        "error": str(e)
+                    }
+
+                finally:
+                    # 10장마다 메모리 상태 로깅 (DEBUG일 때만)
+                    completed += 1
+                    if completed % 10 == 0 and logger.isEnabledFor(logging.DEBUG):
+                        log_memory_usage(f"[배치 채점 진행 {completed}/{total}] ")
+
+        jobs = [(idx, scan.filename, scan.file) for idx, scan in enumerate(scans)]
+
+        if stream:
+            # FastAPI는 엔드포인트가 반환되면(응답 전송 전) 업로드 파일을 닫으므로
+            # 스트리밍 중에도 읽을 수 있도록 임시 파일을 UploadFile에서 분리해 직접 닫음
+            for scan in scans:
+                scan.file = io.BytesIO()
+
+            async def stream_results():
+                tasks = [asyncio.create_task(grade_one(*job)) for job in jobs]
+                successful = 0
+                score_sum = 0.0
+                try:
+                    # 완료된 순서대로 한 줄씩 전송 (각 결과의 index로 입력 순서 확인 가능)
+                    for next_done in asyncio.as_completed(tasks):
+                        result = await next_done
+                        if result["success"]:
+                            successful += 1
+                            score_sum += result["grading"]["total_score"]
+                        yield orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+                    yield orjson.dumps({
+                        "done": True,
+                        "total": total,
+                        "successful": successful,
+                        "failed": total - successful,
+                        "average_score": round(score_sum / successful, 2) if successful else 0.0
+                    }) + b"\n"
+                finally:
+                    # 클라이언트 연결이 끊긴 경우 남은 작업 취소
+                    # 스레드에서 읽는 중인 파일은 워커가 닫으므로 시작 전에 취소된 작업의 파일만 닫음
+                    for task in tasks:
+                        task.cancel()
+                    for idx, _, scan_file in jobs:
+                        if idx not in started:
+                            scan_file.close()
+                    release_free_memory()
+                    log_memory_usage("[배치 채점 완료] ")
+
+            return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+        # 입력 순서대로 결과 수집 (동시에 최대 BATCH_CONCURRENCY장 처리)
+        results = await asyncio.gather(*[grade_one(*job) for job in jobs])
+
+        # 해제된 버퍼의 빈 페이지를 OS에 반환
+        release_free_memory()
         log_memory_usage("[배치 채점 완료] ")
         logger.info(f"배치 채점 완료 - 최종 메모리 정리 수행")
 
-        # 통계 계산
-        successful = sum(1 for r in results if r.get("success", False))
+        # 통계 계산 (성공 수와 점수 합계를 한 번의 순회로 집계)
+        successful = 0
+        score_sum = 0.0
+        for r in results:
+            if r["success"]:
+                successful += 1
+                score_sum += r["grading"]["total_score"]
         failed = len(results) - successful
+        average_score = score_sum / successful if successful else 0.0
 
-        # 평균 점수 계산
-        if successful > 0:
-            total_scores = [r["grading"]["total_score"] for r in results if r.get("success", False)]
-            average_score = sum(total_scores) / len(total_scores)
-        else:
-            average_score = 0.0
-
-        return {
+        # jsonable_encoder 순회 없이 orjson으로 바로 직렬화 (최대 100개 채점 결과)
+        return ORJSONResponse({
             "success": True,
             "total": len(results),
             "successful": successful,
             "failed": failed,
             "average_score": round(average_score, 2),
             "results": results
-        }
+        })
 
     except HTTPException:
         raise
@@ -428,3 +436,79 @@ async def grade_exams_batch(
             status_code=500,
             detail=f"배치 채점 중 오류가 발생했습니다: {str(e)}"
         )
+
+
+def _grade_scan(
+    scan_file: BinaryIO,
+    template_bytes: Optional[bytes],
+    template_key: Optional[bytes],
+    method: str,
+    answer_key: Sequence[int],
+    threshold: float,
+    score_per_question: float
+) -> Optional[dict]:
+    """
+    스캔 1장 정렬 후 채점 (배치 워커 스레드에서 실행)
+    요청이 취소되어도 스레드는 계속 실행되므로 scan_file은 여기서 직접 닫음
+
+    Args:
+        scan_file: 업로드 파일 객체 (bytes로 복사하지 않고 바로 디코딩, 처리 후 닫힘)
+        template_bytes: 템플릿 이미지 바이트 데이터
+        template_key: 템플릿 캐시 키
+        method: 정렬 방식
+        answer_key: 정답 리스트
+        threshold: 마킹 판단 임계값
+        score_per_question: 문제당 배점
+
+    Returns:
+        채점 결과 딕셔너리. 정렬 실패 시 None
+    """
+    # JPEG 인코딩/디코딩 없이 정렬된 배열을 바로 채점
+    try:
+        aligned_img, metadata = align_scan_to_template(
+            scan_bytes=scan_file,
+            template_bytes=template_bytes,
+            template_key=template_key,
+            method=method,
+            enhance=True,
+            output_format=None
+        )
+    finally:
+        scan_file.close()
+
+    if not metadata.get("success"):
+        return None
+
+    return grade_omr_sheet(aligned_img, answer_key, threshold, score_per_question)
+
+
+@lru_cache(maxsize=128)
+def _parse_answer_key(raw: str) -> tuple:
+    """
+    정답 JSON 문자열 파싱 (같은 정답으로 반복 채점하는 경우가 많아 원본 문자열 기준으로 캐싱)
+
+    Args:
+        raw: 정답 리스트 JSON 배열 문자열
+
+    Returns:
+        정답 튜플 (캐시와 공유되므로 변경 불가능한 tuple로 반환)
+        1.0 같은 정수 값 실수는 int로 변환, null(무효 문항)은 None으로 유지
+
+    Raises:
+        orjson.JSONDecodeError: JSON 형식이 아닌 경우
+        ValueError: 45개 정수(또는 null) 배열이 아닌 경우
+    """
+    answer_key = orjson.loads(raw)
+    if not isinstance(answer_key, list) or len(answer_key) != 45:
+        raise ValueError("정답은 45개의 숫자 배열이어야 합니다")
+
+    normalized = []
+    for answer in answer_key:
+        # bool은 int의 하위 타입이므로 type으로 정확히 비교
+        if answer is None or type(answer) is int:
+            normalized.append(answer)
+        elif type(answer) is float and answer.is_integer():
+            normalized.append(int(answer))
+        else:
+            raise ValueError("정답은 45개의 숫자 배열이어야 합니다")
+    return tuple(normalized)
@@ -2,15 +2,19 @@
 ROI 영역 시각화를 위한 Flask 디버그 서버
 템플릿 이미지에 마킹 검출 영역을 표시하여 좌표 설정이 올바른지 확인
 """
-from flask import Flask, send_file, render_template_string, request, jsonify
+from flask import Flask, send_file, render_template_string, request, jsonify, make_response
 import cv2
 import numpy as np
-from app.core.omr_utils import get_bubble_roi, GRID_CONFIG, is_bubble_marked
-from app.core.image_utils import align_with_sift
+from app.core.omr_utils import get_bubble_rois, GRID_CONFIG, binarize_sheet, get_bubble_rects, compute_bubble_densities
+from app.core.image_utils import align_scan_to_template
+from app.core.default_template import DEFAULT_TEMPLATE_PATH, load_default_template
+import hashlib
 import io
-from PIL import Image
-import requests
+import json
 import os
+import sys
+import traceback
+from functools import lru_cache
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
@@ -18,6 +22,16 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
 # 템플릿 이미지 경로 (OMR 카드 기준 이미지)
 TEMPLATE_PATH = "omr_card.jpg"
 
+# 화면 표시용 템플릿 최대 크기 (px, 브라우저 표시 폭 기준, ?full=1 이면 원본 해상도)
+PREVIEW_MAX_DIMENSION = 1600
+
+# 정렬을 FastAPI 서버로 위임할지 여부 (기본: 같은 프로세스에서 직접 정렬)
+ALIGN_VIA_HTTP = os.getenv("ALIGN_VIA_HTTP", "").lower() in ("1", "true", "yes")
+
+# 정렬 API (FastAPI 서버) - 세션 재사용으로 요청마다 TCP 연결을 새로 맺지 않음
+ALIGN_API_URL = "http://localhost:8080/api/align/"
+_align_session = None
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html>
@@ -182,8 +196,8 @@ HTML_TEMPLATE = """
         <h2>📤 OMR 이미지 정렬 및 검출 테스트</h2>
 
         <div class="warning">
-            <strong>⚠️ 주의:</strong> 이 기능을 사용하려면 FastAPI 서버(포트 8080)가 실행 중이어야 합니다.<br>
-            <code>python main.py</code> 명령으로 서버를 먼저 실행하세요.
+            <strong>⚠️ 주의:</strong> <code>ALIGN_VIA_HTTP=1</code>로 실행한 경우 FastAPI 서버(포트 8080)가 실행 중이어야 합니다.<br>
+            <code>python main.py</code> 명령으로 서버를 먼저 실행하세요. (기본값은 이 서버에서 직접 정렬)
         </div>
 
         <div class="upload-section">
@@ -267,20 +281,108 @@ HTML_TEMPLATE = """
 """
 
 
-def load_template():
-    """템플릿 이미지 로드"""
-    img = cv2.imread(TEMPLATE_PATH)
+@lru_cache(maxsize=4)
+def _read_template(template_path, max_dimension=None):
+    """
+    템플릿 이미지를 디스크에서 읽고 디코딩 (경로/크기별 1회만 수행)
+
+    Args:
+        template_path: 템플릿 이미지 경로
+        max_dimension: 긴 변 최대 크기 (None이면 원본 해상도)
+
+    Returns:
+        읽기 전용 BGR 이미지 (파일이 없으면 안내 문구가 있는 더미 이미지)
+    """
+    if max_dimension is not None:
+        full_img = _read_template(template_path)
+        scale = max_dimension / max(full_img.shape[:2])
+        if scale >= 1:
+            return full_img
+
+        # ROI 좌표는 퍼센트 기준이므로 축소된 이미지 크기로 그대로 계산됨
+        img = cv2.resize(full_img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        img.setflags(write=False)
+        return img
+
+    img = cv2.imread(template_path)
     if img is None:
         # 템플릿이 없으면 더미 이미지 생성
         img = np.ones((3508, 2480, 3), dtype=np.uint8) * 255
         cv2.putText(img, "Template image not found", (50, 100),
                    cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 0, 0), 3)
-        cv2.putText(img, f"Expected path: {TEMPLATE_PATH}", (50, 200),
+        cv2.putText(img, f"Expected path: {template_path}", (50, 200),
                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+
+    # 캐시된 원본이 수정되지 않도록 보호
+    img.setflags(write=False)
     return img
 
 
-def draw_roi_on_template(questions=None, show_numbers=False, show_densities=False):
+def load_template(full=False):
+    """
+    템플릿 이미지 로드 (캐시된 디코딩 결과의 복사본, 자유롭게 그려도 됨)
+
+    Args:
+        full: True면 원본 해상도, False면 화면 표시용 축소본 (PREVIEW_MAX_DIMENSION)
+    """
+    return _read_template(TEMPLATE_PATH, None if full else PREVIEW_MAX_DIMENSION).copy()
+
+
+def blend_roi_fills(img, xs, ys, width, height, color, alpha=0.2):
+    """
+    여러 ROI를 반투명 색으로 채움 (in-place)
+    전체 이미지를 복사/블렌딩하지 않고 ROI 영역 슬라이스만 블렌딩
+
+    Args:
+        img: BGR 이미지 (직접 수정됨)
+        xs, ys: ROI 좌상단 좌표 배열
+        width, height: ROI 크기
+        color: 채울 색 (B, G, R)
+        alpha: 채우기 색 비율 (기본값: 0.2)
+    """
+    img_height, img_width = img.shape[:2]
+
+    # cv2.rectangle(-1)과 같은 영역 (끝점 포함), 모든 ROI 크기가 같으므로 색 타일 1장 재사용
+    tile = np.empty((height + 1, width + 1, 3), dtype=np.uint8)
+    tile[:] = color
+
+    for x, y in zip(np.ravel(xs).tolist(), np.ravel(ys).tolist()):
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width + 1, img_width), min(y + height + 1, img_height)
+        if x1 <= x0 or y1 <= y0:
+            continue
+
+        roi = img[y0:y1, x0:x1]
+        roi[:] = cv2.addWeighted(tile[:y1 - y0, :x1 - x0], alpha, roi, 1.0 - alpha, 0)
+
+
+def draw_roi_borders(img, xs, ys, width, height, color, thickness=2):
+    """
+    여러 ROI 테두리를 한 번의 cv2.polylines 호출로 그림 (in-place)
+
+    Args:
+        img: BGR 이미지 (직접 수정됨)
+        xs, ys: ROI 좌상단 좌표 배열
+        width, height: ROI 크기
+        color: 테두리 색 (B, G, R)
+        thickness: 테두리 두께 (기본값: 2)
+    """
+    xs = np.ravel(xs)
+    ys = np.ravel(ys)
+    if xs.size == 0:
+        return
+
+    # (N, 4, 2) 사각형 꼭짓점: 좌상단 → 우상단 → 우하단 → 좌하단
+    corners = np.empty((xs.size, 4, 2), dtype=np.int32)
+    corners[:, [0, 3], 0] = xs[:, None]
+    corners[:, [1, 2], 0] = xs[:, None] + width
+    corners[:, [0, 1], 1] = ys[:, None]
+    corners[:, [2, 3], 1] = ys[:, None] + height
+
+    cv2.polylines(img, list(corners), True, color, thickness)
+
+
+def draw_roi_on_template(questions=None, show_numbers=False, show_densities=False, full=False):
     """
     템플릿 이미지에 ROI를 그림
 
@@ -288,69 +390,171 @@ def draw_roi_on_template(questions=None, show_numbers=False, show_densities=Fals
         questions: 표시할 문제 번호 리스트 (None이면 전체)
         show_numbers: 문제/선택지 번호 표시 여부
         show_densities: 어두움 비율 표시 여부 (실제 스캔 이미지 필요)
+        full: 원본 해상도로 그릴지 여부 (기본값: 화면 표시용 축소본)
     """
-    img = load_template()
+    img = load_template(full=full)
     img_height, img_width = img.shape[:2]
 
     if questions is None:
         questions = range(1, 46)
 
-    for question in questions:
-        for option in range(1, 6):
-            try:
-                x, y, width, height = get_bubble_roi(img_height, img_width, question, option)
-
-                # ROI 사각형 그리기 (초록색, 반투명)
-                overlay = img.copy()
-                cv2.rectangle(overlay, (x, y), (x + width, y + height), (0, 255, 0), 2)
-                cv2.rectangle(overlay, (x, y), (x + width, y + height), (0, 255, 0), -1)
-                img = cv2.addWeighted(overlay, 0.2, img, 0.8, 0)
-                cv2.rectangle(img, (x, y), (x + width, y + height), (0, 255, 0), 2)
+    # 전체 ROI 좌표 (45, 5) - 이미지 크기별 캐시
+    xs, ys, width, height = get_bubble_rois(img_height, img_width)
+    rows = np.asarray(list(questions), dtype=np.intp) - 1
+    xs, ys = xs[rows], ys[rows]
 
-                if show_numbers:
-                    # 문제 번호 표시 (빨간색)
-                    if option == 1:
-                        cv2.putText(img, f"Q{question}", (x - 30, y + height // 2),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 255), 1)
+    # ROI 채우기 (초록색, 반투명) + 테두리
+    blend_roi_fills(img, xs, ys, width, height, (0, 255, 0))
+    draw_roi_borders(img, xs, ys, width, height, (0, 255, 0), 2)
 
-                    # 선택지 번호 표시 (파란색)
-                    cv2.putText(img, str(option), (x + width // 3, y + height // 2),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 0), 1)
+    if show_numbers:
+        for question, row_xs, row_ys in zip(questions, xs.tolist(), ys.tolist()):
+            for option, (x, y) in enumerate(zip(row_xs, row_ys), start=1):
+                # 문제 번호 표시 (빨간색)
+                if option == 1:
+                    cv2.putText(img, f"Q{question}", (x - 30, y + height // 2),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 255), 1)
 
-            except Exception as e:
-                print(f"Error drawing ROI for Q{question} Option{option}: {e}")
+                # 선택지 번호 표시 (파란색)
+                cv2.putText(img, str(option), (x + width // 3, y + height // 2),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 0), 1)
 
     return img
 
 
-def numpy_to_bytes(img):
-    """NumPy 이미지를 bytes로 변환"""
-    # BGR to RGB
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    pil_img = Image.fromarray(img_rgb)
-    img_io = io.BytesIO()
-    pil_img.save(img_io, 'PNG')
-    img_io.seek(0)
-    return img_io
+@lru_cache(maxsize=4)
+def get_label_layer(img_height, img_width):
+    """
+    정렬 결과 표시용 문제/선택지 번호 레이어 (이미지 크기별 1회만 그림)
+    정렬된 답안지는 항상 템플릿 크기이므로 요청 간 재사용됨
+
+    Args:
+        img_height: 이미지 높이
+        img_width: 이미지 너비
+
+    Returns:
+        (BGR 레이어, 글자 픽셀 마스크) 튜플 (읽기 전용)
+    """
+    layer = np.zeros((img_height, img_width, 3), dtype=np.uint8)
+    xs, ys, width, height = get_bubble_rois(img_height, img_width)
+
+    for question, row_xs, row_ys in zip(range(1, 46), xs.tolist(), ys.tolist()):
+        for option, (x, y) in enumerate(zip(row_xs, row_ys), start=1):
+            if option == 1:
+                # 문제 번호
+                cv2.putText(layer, f"Q{question}", (x - 40, y + height // 2),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 0), 2)
+
+            # 선택지 번호
+            cv2.putText(layer, str(option), (x + width // 3, y + height // 2 + 5),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 0), 1)
+
+    # 안티앨리어싱 없이 그리므로 0이 아닌 픽셀이 곧 글자 영역
+    mask = np.any(layer != 0, axis=2).astype(np.uint8)
+
+    layer.setflags(write=False)
+    mask.setflags(write=False)
+    return layer, mask
+
+
+def numpy_to_bytes(img, image_format="jpeg"):
+    """
+    NumPy(BGR) 이미지를 bytes로 변환
+
+    Args:
+        img: BGR 이미지
+        image_format: "jpeg" (기본값, 빠름) 또는 "png" (무손실)
+    """
+    if image_format == "png":
+        # 로컬 디버그용이므로 압축률보다 속도 우선 (OpenCV 버전별 기본값에 의존하지 않도록 명시)
+        success, buffer = cv2.imencode('.png', img, [int(cv2.IMWRITE_PNG_COMPRESSION), 1])
+    else:
+        success, buffer = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
+
+    if not success:
+        raise ValueError("이미지 인코딩 실패")
+
+    return io.BytesIO(buffer.tobytes())
+
+
+def requested_image_format():
+    """요청한 응답 이미지 포맷 (기본 JPEG, ?format=png 이면 무손실 PNG)"""
+    return "png" if request.args.get('format', '').lower() == 'png' else "jpeg"
+
+
+def send_image(img):
+    """이미지 응답 반환 (기본 JPEG, ?format=png 이면 무손실 PNG)"""
+    image_format = requested_image_format()
+    return send_file(numpy_to_bytes(img, image_format), mimetype=f'image/{image_format}')
+
+
+@lru_cache(maxsize=32)
+def render_template_rois(template_path, questions, show_numbers, image_format, full=False):
+    """
+    템플릿 ROI 표시 이미지를 그리고 인코딩한 결과 (입력별 캐시)
+    템플릿과 GRID_CONFIG가 고정이므로 같은 요청은 그리기/인코딩 없이 바로 응답
+
+    Args:
+        template_path: 템플릿 이미지 경로 (경로 변경 시 캐시 구분용)
+        questions: 표시할 문제 번호 튜플 (None이면 전체)
+        show_numbers: 문제/선택지 번호 표시 여부
+        image_format: "jpeg" 또는 "png"
+        full: 원본 해상도 여부
+
+    Returns:
+        (인코딩된 이미지 bytes, ETag) 튜플
+    """
+    img = draw_roi_on_template(questions=questions, show_numbers=show_numbers, full=full)
+    image_bytes = numpy_to_bytes(img, image_format).getvalue()
+
+    # 출력이 입력에 대해 결정적이므로 결과 해시를 ETag로 사용 (템플릿/설정이 바뀌면 자동으로 달라짐)
+    etag = hashlib.sha256(image_bytes).hexdigest()[:32]
+    return image_bytes, etag
+
+
+def send_template_rois(questions=None, show_numbers=False):
+    """
+    템플릿 ROI 표시 이미지 응답 (캐시된 인코딩 결과 사용, ?full=1 이면 원본 해상도)
+    If-None-Match가 ETag와 같으면 본문 없이 304 응답
+    """
+    image_format = requested_image_format()
+    full = request.args.get('full', '').lower() in ('1', 'true')
+    image_bytes, etag = render_template_rois(
+        TEMPLATE_PATH,
+        tuple(questions) if questions is not None else None,
+        show_numbers,
+        image_format,
+        full
+    )
+    return send_file(
+        io.BytesIO(image_bytes),
+        mimetype=f'image/{image_format}',
+        etag=etag,
+        max_age=300
+    )
+
+
+@lru_cache(maxsize=1)
+def render_index_html():
+    """메인 페이지 HTML (GRID_CONFIG가 고정이므로 최초 1회만 렌더링)"""
+    grid_info = json.dumps(GRID_CONFIG, indent=2, ensure_ascii=False)
+    return render_template_string(HTML_TEMPLATE, grid_config=grid_info)
 
 
 @app.route('/')
 def index():
     """메인 페이지"""
-    import json
-    grid_info = json.dumps(GRID_CONFIG, indent=2, ensure_ascii=False)
-    return render_template_string(HTML_TEMPLATE, grid_config=grid_info)
+    response = make_response(render_index_html())
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
 
 
 @app.route('/roi/all')
 def show_all_rois():
     """모든 ROI 표시"""
-    from flask import request
     show_numbers = request.args.get('show_numbers', 'false').lower() == 'true'
 
-    img = draw_roi_on_template(show_numbers=show_numbers)
-    img_bytes = numpy_to_bytes(img)
-    return send_file(img_bytes, mimetype='image/png')
+    return send_template_rois(show_numbers=show_numbers)
 
 
 @app.route('/roi/question/<int:question_num>')
@@ -359,9 +563,7 @@ def show_question_roi(question_num):
     if not (1 <= question_num <= 45):
         return "문제 번호는 1-45 사이여야 합니다.", 400
 
-    img = draw_roi_on_template(questions=[question_num], show_numbers=True)
-    img_bytes = numpy_to_bytes(img)
-    return send_file(img_bytes, mimetype='image/png')
+    return send_template_rois(questions=[question_num], show_numbers=True)
 
 
 @app.route('/roi/column/<int:column_num>')
@@ -373,9 +575,7 @@ def show_column_roi(column_num):
     column_config = GRID_CONFIG["columns"][column_num - 1]
     questions = range(column_config["start"], column_config["end"] + 1)
 
-    img = draw_roi_on_template(questions=questions, show_numbers=True)
-    img_bytes = numpy_to_bytes(img)
-    return send_file(img_bytes, mimetype='image/png')
+    return send_template_rois(questions=questions, show_numbers=True)
 
 
 @app.route('/roi/analyze/<path:image_path>')
@@ -391,69 +591,113 @@ def analyze_image(image_path):
 
         img_height, img_width = img.shape[:2]
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if len(img.shape) == 3 else img
+        binary = binarize_sheet(gray)
+
+        # 전체 ROI 좌표 (45, 5) - 이미지 크기별 캐시
+        xs, ys, width, height = get_bubble_rois(img_height, img_width)
 
-        from app.core.omr_utils import is_bubble_marked
+        # 225개 버블 어두움 비율을 한 번에 계산 (45, 5)
+        densities = compute_bubble_densities(binary, get_bubble_rects(img_height, img_width))
+        marked = densities > 0.45
 
-        for question in range(1, 46):
-            for option in range(1, 6):
-                x, y, width, height = get_bubble_roi(img_height, img_width, question, option)
-                is_marked, density = is_bubble_marked(gray, x, y, width, height, threshold=0.45)
+        # ROI 사각형 (마킹된 것은 빨간색, 아닌 것은 초록색) - 색별 1회 호출
+        draw_roi_borders(img, xs[marked], ys[marked], width, height, (0, 0, 255), 2)
+        draw_roi_borders(img, xs[~marked], ys[~marked], width, height, (0, 255, 0), 2)
 
-                # ROI 사각형 (마킹된 것은 빨간색, 아닌 것은 초록색)
+        for row_xs, row_ys, row_densities, row_marked in zip(xs.tolist(), ys.tolist(), densities.tolist(), marked.tolist()):
+            for x, y, density, is_marked in zip(row_xs, row_ys, row_densities, row_marked):
                 color = (0, 0, 255) if is_marked else (0, 255, 0)
-                cv2.rectangle(img, (x, y), (x + width, y + height), color, 2)
 
                 # 어두움 비율 표시
                 cv2.putText(img, f"{density:.2f}", (x, y - 5),
                            cv2.FONT_HERSHEY_SIMPLEX, 0.3, color, 1)
 
-        img_bytes = numpy_to_bytes(img)
-        return send_file(img_bytes, mimetype='image/png')
+        return send_image(img)
 
     except Exception as e:
         return f"오류 발생: {str(e)}", 500
 
 
-@app.route('/align-and-analyze', methods=['POST'])
-def align_and_analyze():
+def align_in_process(file):
     """
-    업로드된 이미지를 정렬하고 ROI 분석 수행
-    FastAPI 서버(/api/align/)를 호출하여 정렬 수행
+    업로드 파일을 기본 템플릿에 맞춰 같은 프로세스에서 정렬 (/api/align/과 동일한 처리)
+
+    Args:
+        file: 업로드된 파일 (werkzeug FileStorage)
+
+    Returns:
+        (정렬된 BGR 이미지, 정렬 성공 여부, 정렬 방식)
+
+    Raises:
+        ValueError: 기본 템플릿이 없거나 스캔 이미지를 읽을 수 없는 경우
     """
-    try:
-        # 파일 확인
-        if 'image' not in request.files:
-            return jsonify({'error': '이미지 파일이 없습니다.'}), 400
+    default_template = load_default_template()
+    if default_template is None:
+        raise ValueError(f"기본 템플릿 파일을 찾을 수 없습니다: {DEFAULT_TEMPLATE_PATH}")
+    template_bytes, template_key = default_template
 
-        file = request.files['image']
-        if file.filename == '':
-            return jsonify({'error': '파일이 선택되지 않았습니다.'}), 400
+    print(f"정렬 수행 - 파일: {file.filename}")
 
-        # 옵션 가져오기
-        show_density = request.form.get('show_density', 'true').lower() == 'true'
-        show_numbers = request.form.get('show_numbers', 'true').lower() == 'true'
+    # 업로드 스트림에서 바로 디코딩하고 인코딩 없이 BGR 배열로 받음
+    aligned_img, metadata = align_scan_to_template(
+        scan_bytes=file.stream,
+        template_bytes=template_bytes,
+        template_key=template_key,
+        method='sift',
+        enhance=True,
+        output_format=None
+    )
 
-        # FastAPI 서버에 정렬 요청
-        print(f"FastAPI 서버에 정렬 요청 - 파일: {file.filename}")
+    # 품질 개선 결과는 그레이스케일이므로 컬러 ROI 표시를 위해 3채널로 변환
+    if aligned_img.ndim == 2:
+        aligned_img = cv2.cvtColor(aligned_img, cv2.COLOR_GRAY2BGR)
 
-        # 파일을 다시 읽기 위해 시작 위치로 이동
-        file.seek(0)
+    return aligned_img, metadata.get('success', False), metadata.get('method', 'sift')
 
-        # FastAPI 서버 호출
-        files = {'scan': (file.filename, file.read(), file.content_type)}
-        data = {
-            'method': 'sift',
-            'enhance': 'true',
-            'return_image': 'true'
-        }
 
-        response = requests.post(
-            'http://localhost:8080/api/align/',
-            files=files,
-            data=data,
-            timeout=30
-        )
+def get_align_session():
+    """
+    정렬 API 호출용 requests 세션 (ALIGN_VIA_HTTP 사용 시에만 최초 1회 생성)
+    기본 경로(프로세스 내 정렬)에서는 requests를 import하지 않음
+    """
+    global _align_session
+
+    if _align_session is None:
+        import requests
+        _align_session = requests.Session()
+        # /api/align/은 공개 경로지만 API_KEY가 설정되어 있으면 함께 전송
+        api_key = os.getenv("API_KEY")
+        if api_key:
+            _align_session.headers["X-API-Key"] = api_key
+
+    return _align_session
 
+
+def align_via_http(file):
+    """
+    FastAPI 서버(/api/align/)를 호출하여 정렬 (ALIGN_VIA_HTTP 설정 시, 프로세스 간 디버깅용)
+
+    Args:
+        file: 업로드된 파일 (werkzeug FileStorage)
+
+    Returns:
+        (정렬된 BGR 이미지, 정렬 성공 여부, 정렬 방식)
+
+    Raises:
+        ValueError: FastAPI 서버가 오류를 반환한 경우
+    """
+    print(f"FastAPI 서버에 정렬 요청 - 파일: {file.filename}")
+
+    # FastAPI 서버 호출
+    files = {'scan': (file.filename, file.read(), file.content_type)}
+    data = {
+        'method': 'sift',
+        'enhance': 'true',
+        'return_image': 'true'
+    }
+
+    # 응답 본문을 한 번만 읽어 그대로 디코딩 (response.content 버퍼링 + 복사 생략)
+    with get_align_session().post(ALIGN_API_URL, files=files, data=data, stream=True, timeout=30) as response:
         if response.status_code != 200:
             error_msg = f'FastAPI 서버 오류 (HTTP {response.status_code})'
             try:
@@ -462,95 +706,136 @@ def align_and_analyze():
                     error_msg += f': {error_detail}'
             except:
                 pass
-            return jsonify({'error': error_msg}), 400
+            raise ValueError(error_msg)
 
         # 정렬된 이미지 디코딩
-        aligned_bytes = np.frombuffer(response.content, np.uint8)
+        aligned_bytes = np.frombuffer(response.raw.read(decode_content=True), np.uint8)
         aligned_img = cv2.imdecode(aligned_bytes, cv2.IMREAD_COLOR)
 
-        if aligned_img is None:
-            return jsonify({'error': '정렬된 이미지를 디코딩할 수 없습니다.'}), 400
-
         # 헤더에서 메타데이터 확인
         alignment_success = response.headers.get('X-Alignment-Success', 'False')
         alignment_method = response.headers.get('X-Alignment-Method', 'unknown')
 
+    return aligned_img, alignment_success, alignment_method
+
+
+@app.route('/align-and-analyze', methods=['POST'])
+def align_and_analyze():
+    """
+    업로드된 이미지를 정렬하고 ROI 분석 수행
+    기본은 같은 프로세스에서 정렬, ALIGN_VIA_HTTP 설정 시 FastAPI 서버(/api/align/) 호출
+    """
+    try:
+        # 파일 확인
+        if 'image' not in request.files:
+            return jsonify({'error': '이미지 파일이 없습니다.'}), 400
+
+        file = request.files['image']
+        if file.filename == '':
+            return jsonify({'error': '파일이 선택되지 않았습니다.'}), 400
+
+        # 옵션 가져오기
+        show_density = request.form.get('show_density', 'true').lower() == 'true'
+        show_numbers = request.form.get('show_numbers', 'true').lower() == 'true'
+
+        # 파일을 다시 읽기 위해 시작 위치로 이동
+        file.seek(0)
+
+        try:
+            if ALIGN_VIA_HTTP:
+                aligned_img, alignment_success, alignment_method = align_via_http(file)
+            else:
+                aligned_img, alignment_success, alignment_method = align_in_process(file)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if aligned_img is None:
+            return jsonify({'error': '정렬된 이미지를 디코딩할 수 없습니다.'}), 400
+
         print(f"이미지 정렬 완료 - 성공: {alignment_success}, 방식: {alignment_method}, 크기: {aligned_img.shape}")
 
         # 그레이스케일 변환
         gray = cv2.cvtColor(aligned_img, cv2.COLOR_BGR2GRAY) if len(aligned_img.shape) == 3 else aligned_img
         img_height, img_width = gray.shape
+        binary = binarize_sheet(gray)
 
-        # ROI 그리기
-        for question in range(1, 46):
-            for option in range(1, 6):
-                try:
-                    x, y, width, height = get_bubble_roi(img_height, img_width, question, option)
-                    is_marked, density = is_bubble_marked(gray, x, y, width, height, threshold=0.45)
-
-                    # ROI 사각형 (마킹된 것은 빨간색, 아닌 것은 초록색)
-                    color = (0, 0, 255) if is_marked else (0, 255, 0)
-                    thickness = 3 if is_marked else 2
-
-                    # 반투명 배경
-                    overlay = aligned_img.copy()
-                    cv2.rectangle(overlay, (x, y), (x + width, y + height), color, -1)
-                    cv2.addWeighted(overlay, 0.2, aligned_img, 0.8, 0, aligned_img)
+        # 전체 ROI 좌표 (45, 5) - 이미지 크기별 캐시 (정렬 결과는 항상 템플릿 크기)
+        xs, ys, width, height = get_bubble_rois(img_height, img_width)
 
-                    # 테두리
-                    cv2.rectangle(aligned_img, (x, y), (x + width, y + height), color, thickness)
+        # 225개 버블 어두움 비율을 한 번에 계산 (45, 5)
+        densities = compute_bubble_densities(binary, get_bubble_rects(img_height, img_width))
+        marked = densities > 0.45
 
-                    # 어두움 비율 표시
-                    if show_density:
-                        text = f"{density:.3f}"
-                        font_scale = 0.35
-                        font_thickness = 1
+        # 반투명 배경 (마킹된 것은 빨간색, 아닌 것은 초록색) - 색별 블렌딩 1회
+        blend_roi_fills(aligned_img, xs[marked], ys[marked], width, height, (0, 0, 255))
+        blend_roi_fills(aligned_img, xs[~marked], ys[~marked], width, height, (0, 255, 0))
 
-                        # 텍스트 배경 (가독성 향상)
-                        (text_width, text_height), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)
-                        cv2.rectangle(aligned_img, (x, y - text_height - 5), (x + text_width, y - 2), (255, 255, 255), -1)
+        # 테두리 (마킹된 것은 굵게) - 색별 1회 호출
+        draw_roi_borders(aligned_img, xs[marked], ys[marked], width, height, (0, 0, 255), 3)
+        draw_roi_borders(aligned_img, xs[~marked], ys[~marked], width, height, (0, 255, 0), 2)
 
-                        cv2.putText(aligned_img, text, (x, y - 5),
-                                   cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, font_thickness)
+        # 어두움 비율 표시 (값이 매번 달라 버블마다 그림)
+        if show_density:
+            font_scale = 0.35
+            font_thickness = 1
+            for row_xs, row_ys, row_densities, row_marked in zip(xs.tolist(), ys.tolist(), densities.tolist(), marked.tolist()):
+                for x, y, density, is_marked in zip(row_xs, row_ys, row_densities, row_marked):
+                    color = (0, 0, 255) if is_marked else (0, 255, 0)
+                    text = f"{density:.3f}"
 
-                    # 문제/선택지 번호 표시
-                    if show_numbers:
-                        if option == 1:
-                            # 문제 번호
-                            cv2.putText(aligned_img, f"Q{question}", (x - 40, y + height // 2),
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 0), 2)
+                    # 텍스트 배경 (가독성 향상)
+                    (text_width, text_height), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)
+                    cv2.rectangle(aligned_img, (x, y - text_height - 5), (x + text_width, y - 2), (255, 255, 255), -1)
 
-                        # 선택지 번호
-                        cv2.putText(aligned_img, str(option), (x + width // 3, y + height // 2 + 5),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 0), 1)
+                    cv2.putText(aligned_img, text, (x, y - 5),
+                               cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, font_thickness)
 
-                except Exception as e:
-                    print(f"문제 {question}, 선택지 {option} 처리 중 오류: {e}")
+        # 문제/선택지 번호 표시 (고정 문구이므로 캐시된 레이어를 한 번에 합성)
+        if show_numbers:
+            label_layer, label_mask = get_label_layer(img_height, img_width)
+            cv2.copyTo(label_layer, label_mask, aligned_img)
 
         # 이미지를 바이트로 변환하여 반환
-        img_bytes = numpy_to_bytes(aligned_img)
-        return send_file(img_bytes, mimetype='image/png')
+        return send_image(aligned_img)
 
     except Exception as e:
         print(f"오류 발생: {str(e)}")
-        import traceback
         traceback.print_exc()
         return jsonify({'error': f'서버 오류: {str(e)}'}), 500
 
 
 if __name__ == '__main__':
-    import sys
+    # --debug: Flask 개발 서버(자동 리로드/디버거)로 실행
+    debug_mode = '--debug' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != '--debug']
 
     # 템플릿 경로를 인자로 받을 수 있음
-    if len(sys.argv) > 1:
-        TEMPLATE_PATH = sys.argv[1]
+    if args:
+        TEMPLATE_PATH = args[0]
 
     print("=" * 60)
     print("🔍 OMR ROI 검출 영역 시각화 서버")
     print("=" * 60)
     print(f"📁 템플릿 이미지 경로: {TEMPLATE_PATH}")
     print(f"🌐 서버 주소: http://localhost:5001")
+    print(f"🧭 정렬 방식: {'FastAPI 서버 호출 (' + ALIGN_API_URL + ')' if ALIGN_VIA_HTTP else '프로세스 내 직접 정렬'}")
     print("=" * 60)
+
+    # 직접 정렬 시 기본 템플릿과 특징점 캐시를 미리 준비 (첫 업로드 지연 방지)
+    if not ALIGN_VIA_HTTP:
+        load_default_template()
+
     print("\n브라우저에서 http://localhost:5001 을 열어주세요.\n")
 
-    app.run(debug=True, host='0.0.0.0', port=5001)
+    if debug_mode:
+        app.run(debug=True, host='0.0.0.0', port=5001)
+    else:
+        try:
+            from waitress import serve
+        except ImportError:
+            # waitress 미설치 시 멀티스레드 개발 서버로 대체
+            print("⚠️ waitress가 설치되지 않아 Flask 개발 서버(threaded)로 실행합니다.")
+            app.run(host='0.0.0.0', port=5001, threaded=True)
+        else:
+            # OpenCV 연산은 GIL을 해제하므로 여러 요청을 스레드로 병렬 처리
+            serve(app, host='0.0.0.0', port=5001, threads=8)
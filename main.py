@@ -2,18 +2,29 @@
 시험지 정렬 및 채점 API 서버
 FastAPI 애플리케이션 진입점
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.security import APIKeyHeader
 from fastapi.openapi.docs import get_swagger_ui_html
 from contextlib import asynccontextmanager
+import asyncio
 import logging
+import os
 import sys
 
+# OpenMP 스레드 수는 라이브러리 로드 전에 정해져야 하므로 cv2/numpy import보다 먼저 설정
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+import cv2
+
 from app.routers import align, grade, alimtok
-from app.core.auth import APIKeyMiddleware
+from app.core.auth import APIKeyError, api_key_exception_handler, verify_api_key
+from app.core.upload_limits import MAX_REQUEST_BODY_SIZE
+from app.middleware.body_size_middleware import BodySizeLimitMiddleware
 from app.core.processing_limiter import limiter
+from app.core.sendon_utils import close_async_client
+from app.core.default_template import load_default_template
 
 # 로깅 설정
 logging.basicConfig(
@@ -32,6 +43,12 @@ logging.getLogger("uvicorn.access").addFilter(HealthCheckFilter())
 
 logger = logging.getLogger(__name__)
 
+# OpenCV 내부 스레드 수 (기본값: 1, 배치 동시 처리와 중복 병렬화 방지)
+OPENCV_THREADS = int(os.getenv("OPENCV_THREADS", "1"))
+
+# CORS 허용 도메인 (브라우저 호출용, 프로덕션에서는 특정 도메인만 지정)
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()]
+
 
 # Lifespan 이벤트 핸들러
 @asynccontextmanager
@@ -47,10 +64,26 @@ async def lifespan(app: FastAPI):
     logger.info("API 문서: http://localhost:8080/docs")
     logger.info("=" * 50)
 
+    # OpenCV SIMD 최적화 경로 확인 (pip 휠은 AVX2 등을 런타임에 디스패치)
+    # CPU_* 상수는 pip 휠 바인딩에 없으므로 빌드/CPU 기능 문자열을 그대로 기록 ('*'는 런타임 디스패치 대상)
+    cv2.setUseOptimized(True)
+    logger.info(f"OpenCV {cv2.__version__} 최적화: {cv2.useOptimized()}, CPU 기능: {cv2.getCPUFeaturesLine()}")
+
+    # 병렬성은 배치 동시 처리(BATCH_CONCURRENCY)가 담당하므로 OpenCV 내부 스레드는 제한
+    # (이미지 N장 × 코어 수만큼 스레드가 생겨 스케줄러/캐시가 경합하는 것을 방지)
+    cv2.setNumThreads(OPENCV_THREADS)
+    # GPU 경로가 없으므로 작은 커널에서 디스패치 비용만 큰 OpenCL은 비활성화
+    cv2.ocl.setUseOpenCL(False)
+    logger.info(f"OpenCV 스레드 수: {cv2.getNumThreads()}, OpenCL: {cv2.ocl.useOpenCL()}")
+
+    # 기본 템플릿 읽기 + 특징점 캐시 (블로킹 작업이므로 스레드에서 1회 수행)
+    await asyncio.to_thread(load_default_template)
+
     yield  # 애플리케이션 실행
 
     # 종료 시 실행
     logger.info("서버 종료 중...")
+    await close_async_client()
 
 
 # API 키 헤더 정의 (Swagger UI용)
@@ -59,6 +92,7 @@ api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 # FastAPI 앱 생성
 app = FastAPI(
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,  # orjson 기반 고속 JSON 직렬화
     title="시험지 정렬 및 채점 API",
     description="""
     스캔된 시험지 이미지를 정렬하고 채점하기 위한 API 서버입니다.
@@ -152,7 +186,7 @@ def custom_openapi():
     }
 
     # 기본 보안 설정 (모든 엔드포인트에 적용)
-    # 실제 인증은 미들웨어에서 처리하므로 UI에만 표시
+    # 실제 인증은 라우터 의존성(verify_api_key)에서 처리하므로 UI에만 표시
     openapi_schema["security"] = [{"APIKeyHeader": []}]
 
     app.openapi_schema = openapi_schema
@@ -160,22 +194,26 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
-# CORS 설정
+# 요청 본문 크기 제한 (큰 업로드를 본문 수신 전에 거부)
+# CORS보다 먼저 등록해 CORS가 감싸도록 함 (413/400 응답에도 CORS 헤더 포함)
+app.add_middleware(BodySizeLimitMiddleware, max_body_size=MAX_REQUEST_BODY_SIZE)
+
+# CORS 설정 (CORS_ORIGINS: 쉼표로 구분한 허용 도메인, 미설정 시 전체 허용)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # 프로덕션에서는 특정 도메인만 허용
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# 미들웨어 등록
-app.add_middleware(APIKeyMiddleware)
+# 라우터 등록 (API 키 인증은 라우터 의존성으로 처리, /health 등 앱 엔드포인트는 인증 없음)
+app.include_router(align.router, dependencies=[Depends(verify_api_key)])
+app.include_router(grade.router, dependencies=[Depends(verify_api_key)])
+app.include_router(alimtok.router, dependencies=[Depends(verify_api_key)])
 
-# 라우터 등록
-app.include_router(align.router)
-app.include_router(grade.router)
-app.include_router(alimtok.router)
+# API 키 인증 실패 응답 (401)
+app.add_exception_handler(APIKeyError, api_key_exception_handler)
 
 
 @app.get("/")
@@ -235,7 +273,7 @@ async def global_exception_handler(request, exc):
     전역 예외 핸들러
     """
     logger.error(f"처리되지 않은 예외 발생: {str(exc)}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
@@ -3,10 +3,15 @@
 기존 방식 vs 최적화 방식 비교
 """
 import cv2
+import mmap
+import numpy as np
 import time
-import tracemalloc
+import threading
 from pathlib import Path
-from app.core.memory_monitor import log_memory_usage
+from app.core.memory_monitor import log_memory_usage, PSUTIL_AVAILABLE
+
+if PSUTIL_AVAILABLE:
+    import psutil
 
 # 색상 코드
 GREEN = '\033[92m'
@@ -15,36 +20,87 @@ RED = '\033[91m'
 BLUE = '\033[94m'
 RESET = '\033[0m'
 
-
-def test_basic_alignment(scan_path: str, template_path: str):
-    """기존 방식 테스트 (1200px)"""
+# 배너 문자열 (고정값이므로 import 시 한 번만 생성)
+BANNER_LINE = f"{BLUE}{'='*60}{RESET}"
+BANNER_COMPARE = f"{BLUE}{'='*20} 성능 비교 {'='*21}{RESET}"
+BANNER_TITLE = f"{BLUE}{'='*15} 메모리 최적화 테스트 {'='*15}{RESET}"
+
+
+class PeakRSSMonitor:
+    """
+    측정 구간의 최대 RSS 증가량 추적 (백그라운드 스레드에서 주기적으로 샘플링)
+    tracemalloc처럼 모든 할당에 훅을 걸지 않으므로 측정 대상의 처리 시간을 왜곡하지 않음
+    샘플 간격보다 짧게 끝나는 순간 피크는 놓칠 수 있음 (psutil 없으면 항상 0)
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_bytes = 0
+        self._proc = psutil.Process() if PSUTIL_AVAILABLE else None
+        self._start_rss = 0
+        self._peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = self._proc.memory_info().rss
+        if rss > self._peak_rss:
+            self._peak_rss = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        if self._proc is not None:
+            self._start_rss = self._peak_rss = self._proc.memory_info().rss
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._proc is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+            self.peak_bytes = self._peak_rss - self._start_rss
+        return False
+
+    @property
+    def peak_mb(self) -> float:
+        return self.peak_bytes / 1024 / 1024
+
+
+def test_basic_alignment(scan_bytes: memoryview, template_bytes: memoryview):
+    """
+    기존 방식 테스트 (1200px)
+
+    Args:
+        scan_bytes: 스캔 이미지 데이터 (mmap 뷰)
+        template_bytes: 템플릿 이미지 데이터 (mmap 뷰)
+    """
     print(f"\n{BLUE}=== 기존 방식 테스트 (1200px) ==={RESET}")
 
     from app.core.image_utils import bytes_to_cv2, align_with_sift
 
-    # 메모리 추적 시작
-    tracemalloc.start()
-    start_time = time.time()
-    log_memory_usage("[시작]")
+    # 메모리 추적 시작 (RSS 샘플링)
+    with PeakRSSMonitor() as monitor:
+        start_time = time.perf_counter()
+        log_memory_usage("[시작]")
 
-    # 이미지 로드
-    with open(scan_path, 'rb') as f:
-        scan_bytes = f.read()
-    with open(template_path, 'rb') as f:
-        template_bytes = f.read()
+        # 이미지 디코딩 (파일은 main()에서 한 번만 mmap)
+        scan_img = bytes_to_cv2(scan_bytes, max_dimension=1200)
+        template_img = bytes_to_cv2(template_bytes, max_dimension=1200)
 
-    scan_img = bytes_to_cv2(scan_bytes, max_dimension=1200)
-    template_img = bytes_to_cv2(template_bytes, max_dimension=1200)
+        log_memory_usage("[이미지 로드 후]")
 
-    log_memory_usage("[이미지 로드 후]")
+        # 정렬
+        aligned, match_count = align_with_sift(scan_img, template_img, max_features=300)
 
-    # 정렬
-    aligned, match_count = align_with_sift(scan_img, template_img, max_features=300)
+        # 결과
+        end_time = time.perf_counter()
 
-    # 결과
-    end_time = time.time()
-    current, peak = tracemalloc.get_traced_memory()
-    tracemalloc.stop()
+    peak = monitor.peak_bytes
 
     log_memory_usage("[완료]")
 
@@ -63,37 +119,36 @@ def test_basic_alignment(scan_path: str, template_path: str):
     }
 
 
-def test_optimized_alignment(scan_path: str, template_path: str):
-    """최적화 방식 테스트 (1000px, 다운샘플)"""
+def test_optimized_alignment(scan_bytes: memoryview, template_bytes: memoryview):
+    """
+    최적화 방식 테스트 (1000px, 다운샘플)
+
+    Args:
+        scan_bytes: 스캔 이미지 데이터 (mmap 뷰)
+        template_bytes: 템플릿 이미지 데이터 (mmap 뷰)
+    """
     print(f"\n{BLUE}=== 최적화 방식 테스트 (1000px, 다운샘플) ==={RESET}")
 
     from app.core.image_utils_memory_optimized import align_scan_to_template_memory_optimized
 
-    # 메모리 추적 시작
-    tracemalloc.start()
-    start_time = time.time()
-    log_memory_usage("[시작]")
+    # 메모리 추적 시작 (RSS 샘플링)
+    with PeakRSSMonitor() as monitor:
+        start_time = time.perf_counter()
+        log_memory_usage("[시작]")
 
-    # 이미지 로드 및 정렬
-    with open(scan_path, 'rb') as f:
-        scan_bytes = f.read()
-    with open(template_path, 'rb') as f:
-        template_bytes = f.read()
+        # 이미지 로드 및 정렬 (파일은 main()에서 한 번만 mmap)
+        aligned_bytes, metadata = align_scan_to_template_memory_optimized(
+            scan_bytes=scan_bytes,
+            template_bytes=template_bytes,
+            method="sift",
+            enhance=True,
+            max_dimension=1000
+        )
 
-    log_memory_usage("[이미지 로드 후]")
+        # 결과
+        end_time = time.perf_counter()
 
-    aligned_bytes, metadata = align_scan_to_template_memory_optimized(
-        scan_bytes=scan_bytes,
-        template_bytes=template_bytes,
-        method="sift",
-        enhance=True,
-        max_dimension=1000
-    )
-
-    # 결과
-    end_time = time.time()
-    current, peak = tracemalloc.get_traced_memory()
-    tracemalloc.stop()
+    peak = monitor.peak_bytes
 
     log_memory_usage("[완료]")
 
@@ -113,6 +168,41 @@ def test_optimized_alignment(scan_path: str, template_path: str):
     }
 
 
+def test_upsample_homography():
+    """
+    upsample_with_homography 회귀 검사
+    원소별 스케일 계산이 기존 행렬곱 공식(H_full = S * H * S^-1, S = diag(1/scale, 1/scale, 1))과
+    같은 결과를 내는지 확인
+    """
+    print(f"\n{BLUE}=== Homography 업샘플 회귀 검사 ==={RESET}")
+
+    from app.core.memory_optimizer import upsample_with_homography
+
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 256, (1697, 1200, 3), dtype=np.uint8)
+    target_shape = (1200, 1697)
+
+    for scale in (0.5, 0.589, 0.8):
+        # 다운샘플 좌표에서 구한 것처럼 회전/이동/원근 성분이 있는 Homography
+        angle = rng.uniform(-0.05, 0.05)
+        homography = np.array([
+            [np.cos(angle), -np.sin(angle), rng.uniform(-20, 20)],
+            [np.sin(angle), np.cos(angle), rng.uniform(-20, 20)],
+            [rng.uniform(-1e-5, 1e-5), rng.uniform(-1e-5, 1e-5), 1.0]
+        ])
+
+        scale_matrix = np.diag([1 / scale, 1 / scale, 1.0])
+        expected_H = scale_matrix @ homography @ np.linalg.inv(scale_matrix)
+        expected = cv2.warpPerspective(img, expected_H, target_shape)
+
+        aligned = upsample_with_homography(img, homography, target_shape, scale)
+
+        diff = np.abs(aligned.astype(np.int16) - expected.astype(np.int16))
+        # 부동소수점 반올림 차이로 경계 픽셀 보간값이 1 정도 다를 수 있음
+        assert diff.max() <= 1, f"scale={scale}: 최대 차이 {diff.max()}"
+        print(f"  - scale={scale}: {GREEN}✓ 일치{RESET} (최대 차이 {diff.max()})")
+
+
 def test_omr_detection(aligned_img_path: str):
     """OMR 검출 테스트 (기존 vs 배치)"""
     print(f"\n{BLUE}=== OMR 검출 테스트 ==={RESET}")
@@ -124,28 +214,22 @@ def test_omr_detection(aligned_img_path: str):
 
     # 기존 방식
     print(f"\n{YELLOW}기존 방식 (일괄 처리){RESET}")
-    tracemalloc.start()
-    start_time = time.time()
-
-    answers1 = detect_bubbles(img, threshold=0.45)
-
-    end_time = time.time()
-    current, peak = tracemalloc.get_traced_memory()
-    tracemalloc.stop()
+    with PeakRSSMonitor() as monitor:
+        start_time = time.perf_counter()
+        answers1 = detect_bubbles(img, threshold=0.45)
+        end_time = time.perf_counter()
+    peak = monitor.peak_bytes
 
     print(f"  - 처리 시간: {end_time - start_time:.3f}초")
     print(f"  - 피크 메모리: {peak / 1024 / 1024:.2f}MB")
 
     # 최적화 방식
     print(f"\n{YELLOW}최적화 방식 (배치 처리){RESET}")
-    tracemalloc.start()
-    start_time = time.time()
-
-    answers2 = detect_bubbles_batch_optimized(img, threshold=0.45, batch_size=15)
-
-    end_time = time.time()
-    current, peak = tracemalloc.get_traced_memory()
-    tracemalloc.stop()
+    with PeakRSSMonitor() as monitor:
+        start_time = time.perf_counter()
+        answers2 = detect_bubbles_batch_optimized(img, threshold=0.45, batch_size=15)
+        end_time = time.perf_counter()
+    peak = monitor.peak_bytes
 
     print(f"  - 처리 시간: {end_time - start_time:.3f}초")
     print(f"  - 피크 메모리: {peak / 1024 / 1024:.2f}MB")
@@ -156,15 +240,16 @@ def test_omr_detection(aligned_img_path: str):
     print(f"  - {'✓ 동일' if match else '✗ 다름'}")
 
     if not match:
-        diff_count = sum(1 for k in answers1 if answers1[k] != answers2.get(k))
+        # 두 결과 중 한쪽에만 있는 (문제, 답) 쌍의 문제 번호 = 답이 다른 문제
+        diff_count = len({question for question, _ in answers1.items() ^ answers2.items()})
         print(f"  - 차이 개수: {diff_count}/45")
 
 
 def compare_results(result1: dict, result2: dict):
     """결과 비교 출력"""
-    print(f"\n{BLUE}{'='*60}{RESET}")
-    print(f"{BLUE}{'='*20} 성능 비교 {'='*21}{RESET}")
-    print(f"{BLUE}{'='*60}{RESET}")
+    print(f"\n{BANNER_LINE}")
+    print(BANNER_COMPARE)
+    print(BANNER_LINE)
 
     print(f"\n{YELLOW}처리 시간:{RESET}")
     print(f"  기존:     {result1['time']:.2f}초")
@@ -178,8 +263,10 @@ def compare_results(result1: dict, result2: dict):
     print(f"\n{YELLOW}피크 메모리:{RESET}")
     print(f"  기존:     {result1['peak_memory_mb']:.2f}MB")
     print(f"  최적화:   {result2['peak_memory_mb']:.2f}MB")
-    reduction = (result1['peak_memory_mb'] - result2['peak_memory_mb']) / result1['peak_memory_mb'] * 100
-    print(f"  {GREEN}→ {reduction:.1f}% 절감{RESET}")
+    # RSS 증가량은 0일 수 있음 (psutil 없음, 또는 앞선 테스트에서 확보한 메모리 재사용)
+    if result1['peak_memory_mb'] > 0:
+        reduction = (result1['peak_memory_mb'] - result2['peak_memory_mb']) / result1['peak_memory_mb'] * 100
+        print(f"  {GREEN}→ {reduction:.1f}% 절감{RESET}")
 
     print(f"\n{YELLOW}매칭 수:{RESET}")
     print(f"  기존:     {result1['match_count']}")
@@ -189,14 +276,17 @@ def compare_results(result1: dict, result2: dict):
     print(f"  기존:     {result1['size'][1]}x{result1['size'][0]}")
     print(f"  최적화:   {result2['size'][1]}x{result2['size'][0]}")
 
-    print(f"\n{BLUE}{'='*60}{RESET}\n")
+    print(f"\n{BANNER_LINE}\n")
 
 
 def main():
     """메인 테스트 실행"""
-    print(f"{BLUE}{'='*60}{RESET}")
-    print(f"{BLUE}{'='*15} 메모리 최적화 테스트 {'='*15}{RESET}")
-    print(f"{BLUE}{'='*60}{RESET}")
+    print(BANNER_LINE)
+    print(BANNER_TITLE)
+    print(BANNER_LINE)
+
+    # 0. 이미지 파일 없이 가능한 회귀 검사
+    test_upsample_homography()
 
     # 파일 경로
     scan_path = "samples/20251109130430_페이지_02.png"
@@ -215,9 +305,12 @@ def main():
     print(f"  - 템플릿: {template_path}")
 
     try:
-        # 1. 정렬 테스트
-        result1 = test_basic_alignment(scan_path, template_path)
-        result2 = test_optimized_alignment(scan_path, template_path)
+        # 1. 정렬 테스트 (두 테스트가 같은 파일을 다시 읽지 않도록 한 번만 mmap하여 공유)
+        with open(scan_path, 'rb') as scan_file, open(template_path, 'rb') as template_file, \
+                mmap.mmap(scan_file.fileno(), 0, access=mmap.ACCESS_READ) as scan_mm, \
+                mmap.mmap(template_file.fileno(), 0, access=mmap.ACCESS_READ) as template_mm:
+            result1 = test_basic_alignment(memoryview(scan_mm), memoryview(template_mm))
+            result2 = test_optimized_alignment(memoryview(scan_mm), memoryview(template_mm))
 
         # 2. 결과 비교
         compare_results(result1, result2)
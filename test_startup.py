@@ -0,0 +1,45 @@
+"""
+서버 시작 스모크 테스트
+lifespan(시작/종료)을 실제로 실행하여 시작 단계의 오류(OpenCV API 변경 등)를 배포 전에 확인
+
+사용법: python test_startup.py  (또는 pytest test_startup.py)
+"""
+import os
+
+# auth 모듈이 import 시점에 API_KEY를 요구하므로 app import 전에 설정
+os.environ.setdefault("API_KEY", "startup-smoke-test-key")
+
+from fastapi.testclient import TestClient
+
+# 색상 코드
+GREEN = '\033[92m'
+RED = '\033[91m'
+RESET = '\033[0m'
+
+
+def test_app_startup():
+    """lifespan 시작/종료와 공개 엔드포인트 응답 확인"""
+    from main import app
+
+    # with 블록 진입/종료 시 lifespan 시작/종료가 실행됨
+    with TestClient(app) as client:
+        response = client.get("/health")
+        assert response.status_code == 200, response.text
+        assert response.json()["status"] == "healthy"
+
+        response = client.get("/queue/status")
+        assert response.status_code == 200, response.text
+
+
+def main():
+    """스모크 테스트 실행"""
+    try:
+        test_app_startup()
+    except Exception as e:
+        print(f"{RED}✗ 서버 시작 실패: {e}{RESET}")
+        raise
+    print(f"{GREEN}✓ 서버 시작/종료 정상{RESET}")
+
+
+if __name__ == "__main__":
+    main()